@@ -0,0 +1,445 @@
+"""Budget-respecting allocation of advertisers to episode ad slots."""
+import asyncio
+import bisect
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from operator import attrgetter
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANY_CATEGORY = "*"
+
+
+def normalize_category(category: Optional[str]) -> str:
+    return (category or "").strip().lower()
+
+
+class SlotPricing:
+    """How many slots an episode has and what each costs"""
+
+    def __init__(self, pre_roll: float = 400.0, mid_roll: float = 600.0, post_roll: float = 250.0,
+                 mid_roll_every_minutes: int = 15, max_mid_rolls: int = 3, post_roll_min_minutes: int = 30):
+        self.pre_roll = pre_roll
+        self.mid_roll = mid_roll
+        self.post_roll = post_roll
+        self.mid_roll_every_minutes = mid_roll_every_minutes
+        self.max_mid_rolls = max_mid_rolls
+        self.post_roll_min_minutes = post_roll_min_minutes
+        self._layouts: Dict[int, List[Tuple[str, float]]] = {}
+
+    def slots_for(self, duration_minutes: int) -> List[Tuple[str, float]]:
+        layout = self._layouts.get(duration_minutes)
+        if layout is None:
+            layout = [("pre-roll", self.pre_roll)]
+            mid_rolls = min(self.max_mid_rolls, max(0, duration_minutes) // self.mid_roll_every_minutes)
+            layout.extend((f"mid-roll-{n}", self.mid_roll) for n in range(1, mid_rolls + 1))
+            if duration_minutes >= self.post_roll_min_minutes:
+                layout.append(("post-roll", self.post_roll))
+            self._layouts[duration_minutes] = layout
+        return layout
+
+
+class Slot:
+    """One ad slot; slots are compared by identity and used directly as keys.
+
+    ``key`` is the slot's place in the allocation order: most valuable first,
+    then by episode and position so ties never depend on load order.
+    """
+    __slots__ = ("episode_id", "show_id", "position", "price", "category", "key")
+
+    def __init__(self, episode_id: str, show_id: str, position: str, price: float, category: str, index: int):
+        self.episode_id = episode_id
+        self.show_id = show_id
+        self.position = position
+        self.price = price
+        self.category = category
+        self.key = (-price, episode_id, index)
+
+
+slot_key = attrgetter("key")
+
+# Fields whose changes can move placements; edits to anything else are ignored
+ADVERTISER_FIELDS = ("status", "budget", "target_categories")
+EPISODE_FIELDS = ("status", "duration_minutes", "show_id")
+
+
+class PlacementState:
+    """Placements for one user, repaired incrementally as documents change.
+
+    Allocation is greedy: slots are filled in ``Slot.key`` order, each by
+    the eligible advertiser with the most remaining budget that can afford
+    it, found through max-heaps indexed by target category. An advertiser
+    takes at most one slot per episode.
+
+    A change can only alter decisions from the first slot it touches
+    onwards: the first slot of a changed episode or show, or the first slot
+    a changed advertiser competed or now competes for. ``repair`` keeps
+    every placement before the earliest such slot and re-runs the
+    allocation from there, which gives exactly the placements a full reload
+    would. Changes only record that slot, so a burst of them costs one
+    repair when the placements are next read.
+    """
+
+    def __init__(self, pricing: SlotPricing):
+        self.pricing = pricing
+        self.advertisers: Dict[str, dict] = {}
+        self.episodes: Dict[str, dict] = {}
+        self.show_categories: Dict[str, str] = {}
+        self.slots_by_episode: Dict[str, List[Slot]] = {}
+        self.episodes_by_show: Dict[str, Set[str]] = {}
+        self.order: List[Slot] = []
+        self.assignments: Dict[Slot, str] = {}
+        self.assignments_by_advertiser: Dict[str, Set[Slot]] = {}
+        self.advertisers_by_episode: Dict[str, Set[str]] = {}
+        self.remaining: Dict[str, float] = {}
+        self.unfilled: Set[Slot] = set()
+        # Key of the first slot whose placement may be out of date
+        self._dirty_from: Optional[tuple] = None
+
+    # ---------- loading ----------
+
+    def load(self, advertisers: Iterable[dict], episodes: Iterable[dict], shows: Iterable[dict]):
+        for show in shows:
+            self.show_categories[show["id"]] = normalize_category(show.get("category"))
+        for advertiser in advertisers:
+            self.advertisers[advertiser["id"]] = advertiser
+            self._reset_budget(advertiser["id"])
+        slots = []
+        for episode in episodes:
+            self.episodes[episode["id"]] = episode
+            slots.extend(self._build_slots(episode["id"]))
+        self.order = sorted(slots, key=slot_key)
+        self.fill(self.order)
+
+    # ---------- bookkeeping ----------
+
+    def _eligible(self, advertiser: dict) -> bool:
+        return advertiser.get("status", "active") == "active" and float(advertiser.get("budget") or 0) > 0
+
+    def _targets(self, advertiser: dict) -> List[str]:
+        categories = [normalize_category(c) for c in advertiser.get("target_categories") or [] if c]
+        return categories or [ANY_CATEGORY]
+
+    def _reset_budget(self, advertiser_id: str):
+        advertiser = self.advertisers[advertiser_id]
+        spent = sum(slot.price for slot in self.assignments_by_advertiser.get(advertiser_id, ()))
+        self.remaining[advertiser_id] = float(advertiser.get("budget") or 0) - spent
+
+    def _release(self, slot: Slot):
+        advertiser_id = self.assignments.pop(slot, None)
+        if advertiser_id is None:
+            return
+        self.assignments_by_advertiser[advertiser_id].discard(slot)
+        self.advertisers_by_episode[slot.episode_id].discard(advertiser_id)
+        if advertiser_id in self.remaining:
+            self.remaining[advertiser_id] += slot.price
+        self.unfilled.add(slot)
+
+    def _drop_slots(self, episode_id: str) -> List[Slot]:
+        slots = self.slots_by_episode.pop(episode_id, [])
+        for slot in slots:
+            self._release(slot)
+            self.unfilled.discard(slot)
+            del self.order[bisect.bisect_left(self.order, slot.key, key=slot_key)]
+        self.advertisers_by_episode.pop(episode_id, None)
+        episode = self.episodes.get(episode_id)
+        if episode is not None:
+            self.episodes_by_show.get(episode.get("show_id"), set()).discard(episode_id)
+        return slots
+
+    def _build_slots(self, episode_id: str) -> List[Slot]:
+        """Create the slots of an episode; the caller places them in ``order``"""
+        episode = self.episodes[episode_id]
+        show_id = episode.get("show_id")
+        self.episodes_by_show.setdefault(show_id, set()).add(episode_id)
+        if episode.get("status") != "published" or show_id not in self.show_categories:
+            return []
+        category = self.show_categories[show_id]
+        slots = [
+            Slot(episode_id, show_id, position, price, category, index)
+            for index, (position, price) in enumerate(self.pricing.slots_for(int(episode.get("duration_minutes") or 0)))
+        ]
+        self.slots_by_episode[episode_id] = slots
+        self.unfilled.update(slots)
+        return slots
+
+    def _insert_slots(self, episode_id: str) -> List[Slot]:
+        slots = self._build_slots(episode_id)
+        for slot in slots:
+            bisect.insort(self.order, slot, key=slot_key)
+        return slots
+
+    # ---------- allocation ----------
+
+    def fill(self, slots: Iterable[Slot]):
+        """Greedily fill the unfilled ones of ``slots``, given in allocation order"""
+        if not self.unfilled:
+            return
+        remaining = self.remaining
+        targets = {
+            advertiser_id: self._targets(advertiser)
+            for advertiser_id, advertiser in self.advertisers.items()
+            if self._eligible(advertiser) and remaining[advertiser_id] > 0
+        }
+        if not targets:
+            return
+        heaps: Dict[str, list] = {}
+        for advertiser_id, categories in targets.items():
+            for category in categories:
+                heaps.setdefault(category, []).append((-remaining[advertiser_id], advertiser_id))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        any_heap = heaps.get(ANY_CATEGORY)
+        heappop, heappush = heapq.heappop, heapq.heappush
+        assignments = self.assignments
+        assignments_by_advertiser = self.assignments_by_advertiser
+        advertisers_by_episode = self.advertisers_by_episode
+        unfilled = self.unfilled
+        filled = []
+
+        for slot in slots:
+            if slot not in unfilled:
+                continue
+            price = slot.price
+            taken = advertisers_by_episode.get(slot.episode_id)
+            if taken is None:
+                taken = advertisers_by_episode[slot.episode_id] = set()
+            candidate_heaps = [h for h in (heaps.get(slot.category), any_heap) if h]
+            skipped = []
+            chosen = None
+            while candidate_heaps:
+                best = best_heap = None
+                for heap in candidate_heaps:
+                    # Entries go stale when a budget is spent; drop them lazily
+                    while heap and -heap[0][0] != remaining[heap[0][1]]:
+                        heappop(heap)
+                    if heap and (best is None or heap[0] < best):
+                        best, best_heap = heap[0], heap
+                # Heaps are ordered by remaining budget: if the richest cannot afford it, nobody can
+                if best is None or -best[0] < price:
+                    break
+                heappop(best_heap)
+                if best[1] in taken:
+                    skipped.append((best_heap, best))
+                    continue
+                chosen = best[1]
+                break
+            for heap, entry in skipped:
+                heappush(heap, entry)
+            if chosen is None:
+                continue
+
+            assignments[slot] = chosen
+            assignments_by_advertiser.setdefault(chosen, set()).add(slot)
+            taken.add(chosen)
+            filled.append(slot)
+            left = remaining[chosen] = remaining[chosen] - price
+            if left > 0:
+                for category in targets[chosen]:
+                    heappush(heaps[category], (-left, chosen))
+        unfilled.difference_update(filled)
+
+    def _invalidate_from(self, key: Optional[tuple]):
+        if key is not None and (self._dirty_from is None or key < self._dirty_from):
+            self._dirty_from = key
+
+    def repair(self):
+        """Re-run the allocation from the earliest slot touched since the last repair"""
+        if self._dirty_from is None:
+            return
+        suffix = self.order[bisect.bisect_left(self.order, self._dirty_from, key=slot_key):]
+        self._dirty_from = None
+        for slot in suffix:
+            self._release(slot)
+        for advertiser_id in list(self.assignments_by_advertiser):
+            if advertiser_id not in self.advertisers:
+                del self.assignments_by_advertiser[advertiser_id]  # Removed; holds no slot any more
+        for advertiser_id in self.advertisers:
+            self._reset_budget(advertiser_id)
+        self.fill(suffix)
+
+    def _first_key(self, slots: Iterable[Slot]) -> Optional[tuple]:
+        return min((slot.key for slot in slots), default=None)
+
+    def _first_competed_key(self, categories: Iterable[str]) -> Optional[tuple]:
+        """Key of the first slot an advertiser targeting ``categories`` competes for"""
+        categories = set(categories)
+        for slot in self.order:
+            if ANY_CATEGORY in categories or slot.category in categories:
+                return slot.key
+        return None
+
+    # ---------- incremental updates ----------
+    # These only update the indexes and note the first affected slot; the
+    # allocation is repaired once, when the placements are next read.
+
+    def upsert_advertiser(self, advertiser_id: str, fields: dict):
+        advertiser = self.advertisers.setdefault(advertiser_id, {"id": advertiser_id})
+        before = {name: advertiser.get(name) for name in ADVERTISER_FIELDS}
+        was_eligible, previous_targets = self._eligible(advertiser), self._targets(advertiser)
+        advertiser.update(fields)
+        if advertiser_id in self.remaining and all(advertiser.get(name) == before[name] for name in ADVERTISER_FIELDS):
+            return
+        self._reset_budget(advertiser_id)
+        competed = (previous_targets if was_eligible else []) + (self._targets(advertiser) if self._eligible(advertiser) else [])
+        self._invalidate_from(self._first_competed_key(competed))
+
+    def remove_advertiser(self, advertiser_id: str):
+        advertiser = self.advertisers.pop(advertiser_id, None)
+        if advertiser is None:
+            return
+        self.remaining.pop(advertiser_id, None)
+        if self.assignments_by_advertiser.get(advertiser_id):
+            self._invalidate_from(self._first_key(self.assignments_by_advertiser[advertiser_id]))
+
+    def upsert_episode(self, episode_id: str, fields: dict):
+        episode = self.episodes.get(episode_id)
+        if episode is not None and all(fields.get(name, episode.get(name)) == episode.get(name) for name in EPISODE_FIELDS):
+            episode.update(fields)
+            return
+        dropped = self._drop_slots(episode_id)
+        episode = self.episodes.setdefault(episode_id, {"id": episode_id})
+        episode.update(fields)
+        built = self._insert_slots(episode_id)
+        self._invalidate_from(self._first_key(dropped + built))
+
+    def remove_episode(self, episode_id: str):
+        dropped = self._drop_slots(episode_id)
+        self.episodes.pop(episode_id, None)
+        self._invalidate_from(self._first_key(dropped))
+
+    def upsert_show(self, show_id: str, fields: dict):
+        category = normalize_category(fields.get("category"))
+        if show_id in self.show_categories and ("category" not in fields or self.show_categories[show_id] == category):
+            return
+        self.show_categories[show_id] = category
+        self._reslot_show(show_id)
+
+    def remove_show(self, show_id: str):
+        if self.show_categories.pop(show_id, None) is None:
+            return
+        self._reslot_show(show_id)
+
+    def _reslot_show(self, show_id: str):
+        changed = []
+        for episode_id in list(self.episodes_by_show.get(show_id, ())):
+            changed.extend(self._drop_slots(episode_id))
+            changed.extend(self._insert_slots(episode_id))
+        self._invalidate_from(self._first_key(changed))
+
+    # ---------- output ----------
+
+    def summary(self) -> dict:
+        self.repair()
+        placements = [
+            {
+                "episode_id": slot.episode_id,
+                "show_id": slot.show_id,
+                "slot": slot.position,
+                "price": slot.price,
+                "advertiser_id": advertiser_id,
+            }
+            for slot, advertiser_id in self.assignments.items()
+        ]
+        advertisers = [
+            {
+                "advertiser_id": advertiser_id,
+                "budget": float(advertiser.get("budget") or 0),
+                "spent": float(advertiser.get("budget") or 0) - self.remaining[advertiser_id],
+                "remaining": self.remaining[advertiser_id],
+                "placements": len(self.assignments_by_advertiser.get(advertiser_id, ())),
+            }
+            for advertiser_id, advertiser in self.advertisers.items()
+            if self._eligible(advertiser)
+        ]
+        return {
+            "placements": placements,
+            "advertisers": advertisers,
+            "total_slots": sum(len(slots) for slots in self.slots_by_episode.values()),
+            "unfilled_slots": len(self.unfilled),
+            "revenue": sum(p["price"] for p in placements),
+        }
+
+
+class AdPlacementEngine:
+    """Per-user placement states, loaded on demand and kept current from change events.
+
+    States are reloaded after ``ttl`` seconds regardless, in case an event was
+    missed (another worker's write with a local change feed, a dropped stream).
+    """
+
+    def __init__(self, loader: Callable[[str], Awaitable[Tuple[List[dict], List[dict], List[dict]]]],
+                 pricing: Optional[SlotPricing] = None, max_users: int = 100, ttl: Optional[float] = 300.0):
+        self.loader = loader
+        self.pricing = pricing or SlotPricing()
+        self.max_users = max_users
+        self.ttl = ttl
+        self._states: "OrderedDict[str, PlacementState]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._stale: Set[str] = set()
+
+    async def get(self, user_id: str, recompute: bool = False) -> PlacementState:
+        expired = self.ttl is not None and time.monotonic() - self._loaded_at.get(user_id, 0.0) > self.ttl
+        if recompute or expired:
+            self._states.pop(user_id, None)
+        state = self._states.get(user_id)
+        if state is not None:
+            self._states.move_to_end(user_id)
+            return state
+        if user_id in self._loading:
+            return await asyncio.shield(self._loading[user_id])
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            while True:
+                self._stale.discard(user_id)
+                state = PlacementState(self.pricing)
+                state.load(*await self.loader(user_id))
+                # A change arrived while loading; the snapshot may predate it
+                if user_id not in self._stale:
+                    break
+            self._states[user_id] = state
+            self._loaded_at[user_id] = time.monotonic()
+            if len(self._states) > self.max_users:
+                evicted, _ = self._states.popitem(last=False)
+                self._loaded_at.pop(evicted, None)
+            future.set_result(state)
+            return state
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._loading[user_id]
+
+    def apply(self, user_id: str, event: dict):
+        """Change feed listener: repair the cached state of the event's user"""
+        if user_id in self._loading:
+            self._stale.add(user_id)
+        state = self._states.get(user_id)
+        if state is None:
+            return
+        collection = event.get("collection")
+        op = event.get("op")
+        if op == "reset":
+            self._states.pop(user_id, None)
+            return
+        doc_id = event.get("doc_id")
+        fields = event.get("data") or {}
+        handlers = {
+            "advertisers": (state.upsert_advertiser, state.remove_advertiser),
+            "episodes": (state.upsert_episode, state.remove_episode),
+            "shows": (state.upsert_show, state.remove_show),
+        }
+        if collection not in handlers:
+            return
+        upsert, remove = handlers[collection]
+        if op == "delete":
+            remove(doc_id)
+        else:
+            upsert(doc_id, fields)
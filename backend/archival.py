@@ -0,0 +1,181 @@
+"""Hot/cold tiering: move long-archived documents out of the hot collections."""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def cold_name(collection: str) -> str:
+    return f"{collection}_archive"
+
+
+class ArchiveTier:
+    """A hot collection whose documents in ``status`` go cold once old enough.
+
+    Age counts from ``status_changed_at`` and, for documents written before
+    that field existed, from ``age_field``.
+    """
+
+    def __init__(self, collection: str, status: str, age_field: str = "created_at"):
+        self.collection = collection
+        self.status = status
+        self.age_field = age_field
+
+    def eligible(self, cutoff: datetime) -> dict:
+        cutoff = cutoff.isoformat()
+        return {
+            "status": self.status,
+            "$or": [
+                {"status_changed_at": {"$lt": cutoff}},
+                {"status_changed_at": {"$exists": False}, self.age_field: {"$lt": cutoff}},
+            ],
+        }
+
+
+def merge_tiers(hot: List[dict], cold: List[dict]) -> List[dict]:
+    """Hot documents followed by cold ones; a document caught mid-move appears once"""
+    seen = {doc["id"] for doc in hot}
+    return hot + [doc for doc in cold if doc["id"] not in seen]
+
+
+class Archiver:
+    """Move eligible documents to ``<collection>_archive`` in batches.
+
+    Each batch is copied to the cold collection before it is deleted from the
+    hot one, so an interrupted run leaves duplicates rather than losing data.
+    Documents whose status changed between the copy and the delete stay hot
+    and their cold copy is dropped again. ``on_moved(collection, user_ids)``
+    is called after every batch; ``prepare(collection)`` runs before one.
+
+    Every worker runs an Archiver, but a scheduled run only goes ahead in the
+    worker holding the ``archiver`` lease in ``lease_collection``. The lease
+    lasts one interval, so a worker that dies is replaced on the next one.
+    """
+
+    def __init__(
+        self,
+        get_db: Callable[[], Any],
+        tiers: Iterable[ArchiveTier],
+        min_age: timedelta,
+        batch_size: int = 500,
+        interval: float = 3600.0,
+        on_moved: Optional[Callable[[str, Set[str]], None]] = None,
+        prepare: Optional[Callable[[str], Awaitable[None]]] = None,
+        lease_collection: str = "leases",
+    ):
+        self.get_db = get_db
+        self.tiers: Dict[str, ArchiveTier] = {tier.collection: tier for tier in tiers}
+        self.min_age = min_age
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_moved = on_moved
+        self.prepare = prepare
+        self.lease_collection = lease_collection
+        self._owner = uuid.uuid4().hex
+        self._task = None
+        self._indexes_ready = False
+
+    async def ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        db = self.get_db()
+        for collection in self.tiers:
+            cold = db[cold_name(collection)]
+            await cold.create_index("id", unique=True)
+            await cold.create_index("user_id")
+        self._indexes_ready = True
+
+    async def archive_batch(self, tier: ArchiveTier, cutoff: datetime) -> int:
+        db = self.get_db()
+        hot, cold = db[tier.collection], db[cold_name(tier.collection)]
+        docs = await hot.find(tier.eligible(cutoff), {"_id": 0}).limit(self.batch_size).to_list(self.batch_size)
+        if not docs:
+            return 0
+        ids = [doc["id"] for doc in docs]
+
+        await cold.bulk_write([ReplaceOne({"id": doc["id"]}, doc, upsert=True) for doc in docs], ordered=False)
+        await hot.delete_many({"id": {"$in": ids}, "status": tier.status})
+        still_hot = [doc["id"] for doc in await hot.find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(None)]
+        if still_hot:
+            await cold.delete_many({"id": {"$in": still_hot}})
+
+        moved = len(ids) - len(still_hot)
+        if self.on_moved is not None and moved:
+            skipped = set(still_hot)
+            self.on_moved(tier.collection, {doc["user_id"] for doc in docs if doc["id"] not in skipped})
+        return moved
+
+    async def run_once(self) -> Dict[str, int]:
+        await self.ensure_indexes()
+        cutoff = datetime.now(timezone.utc) - self.min_age
+        totals = {}
+        for tier in self.tiers.values():
+            if self.prepare is not None:
+                await self.prepare(tier.collection)
+            totals[tier.collection] = 0
+            while True:
+                moved = await self.archive_batch(tier, cutoff)
+                totals[tier.collection] += moved
+                if moved < self.batch_size:
+                    break
+                await asyncio.sleep(0)  # Let requests in between batches
+        if any(totals.values()):
+            logger.info("Archived to cold storage: %s", totals)
+        return totals
+
+    async def restore(self, collection: str, user_id: str, doc_id: str) -> Optional[dict]:
+        """Move a document back to its hot collection, or None if it is not archived.
+
+        ``status_changed_at`` is reset so the document stays hot for at least
+        ``min_age`` even if its status is left unchanged.
+        """
+        db = self.get_db()
+        cold = db[cold_name(collection)]
+        doc = await cold.find_one({"id": doc_id, "user_id": user_id}, {"_id": 0})
+        if doc is None:
+            return None
+        doc["status_changed_at"] = datetime.now(timezone.utc).isoformat()
+        await db[collection].replace_one({"id": doc_id}, doc, upsert=True)
+        await cold.delete_one({"id": doc_id})
+        return doc
+
+    async def acquire_lease(self) -> bool:
+        """Take or renew the lease; False while another worker holds it"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.get_db()[self.lease_collection].find_one_and_update(
+                {"_id": "archiver", "$or": [{"expires_at": {"$lt": now}}, {"owner": self._owner}]},
+                {"$set": {"owner": self._owner, "expires_at": now + timedelta(seconds=self.interval)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False  # The upsert collided with the live lease of another worker
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                if await self.acquire_lease():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Archival run failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,94 @@
+"""Run several API reads in-process and collect their responses."""
+import asyncio
+import json
+from typing import Iterable, List, Optional, Tuple
+
+# ``app`` is the router wrapped in exception handling, so HTTPExceptions become
+# responses, and in the middleware whose behaviour depends on the route (ETags,
+# read routing, per-route rate limits). Admission control and compression
+# already applied to the batch request as a whole.
+
+# Conditional headers of the batch request itself must not leak into sub-requests
+PARENT_ONLY_HEADERS = frozenset({b"if-none-match", b"if-modified-since", b"content-length", b"content-type"})
+
+
+async def dispatch(
+    app, parent_scope: dict, method: str, path: str, state: dict, etag: Optional[str] = None
+) -> Tuple[int, Optional[object], Optional[str]]:
+    """Call ``app`` with a copy of ``parent_scope``; returns status, decoded body and ETag"""
+    path, _, query = path.partition('?')
+    headers = [(key, value) for key, value in parent_scope.get("headers", []) if key.lower() not in PARENT_ONLY_HEADERS]
+    if etag:
+        headers.append((b"if-none-match", etag.encode("latin-1")))
+    scope = {
+        **parent_scope,
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": headers,
+        "state": dict(state),
+    }
+    for key in ("route", "endpoint", "path_params", "fastapi_astack", "router"):
+        scope.pop(key, None)
+
+    status = 500
+    headers = {}
+    chunks: List[bytes] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in message["headers"]}
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    payload = b"".join(chunks)
+    if not payload:
+        return status, None, headers.get("etag")
+    if headers.get("content-type", "").startswith("application/json"):
+        return status, json.loads(payload), headers.get("etag")
+    return status, payload.decode("utf-8", errors="replace"), headers.get("etag")
+
+
+async def run_batch(
+    app,
+    parent_scope: dict,
+    requests: Iterable[dict],
+    state: dict,
+    allowed_prefix: str = "/api/",
+    excluded_paths: Iterable[str] = (),
+) -> List[dict]:
+    """Execute GET sub-requests concurrently; each result carries its own status.
+
+    A sub-request may send the ``etag`` of an earlier result and get a 304 with
+    no body back; results carry an ``etag`` whenever the route provides one.
+    """
+    excluded_paths = tuple(excluded_paths)
+
+    async def run_one(index: int, request: dict) -> dict:
+        result = {"id": request.get("id") or str(index), "status": 0, "body": None}
+        method = request.get("method", "GET").upper()
+        path = request["path"]
+        route_path = path.partition('?')[0]
+        if method != "GET":
+            result.update(status=405, body={"detail": "Only GET requests can be batched"})
+        elif not route_path.startswith(allowed_prefix) or route_path.startswith(excluded_paths):
+            result.update(status=400, body={"detail": "Path cannot be batched"})
+        else:
+            try:
+                result["status"], result["body"], etag = await dispatch(
+                    app, parent_scope, method, path, state, request.get("etag")
+                )
+                if etag:
+                    result["etag"] = etag
+            except Exception:
+                result.update(status=500, body={"detail": "Internal Server Error"})
+        return result
+
+    return await asyncio.gather(*(run_one(index, request) for index, request in enumerate(requests)))
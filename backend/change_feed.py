@@ -0,0 +1,299 @@
+"""Per-user change feed: fan-out broker, Mongo change stream source and SSE framing."""
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(data: dict, event: str = "change", event_id: Optional[str] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, default=str, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Subscription:
+    """One connected client; its queue is bounded so a slow reader cannot grow memory"""
+
+    def __init__(self, user_id: str, max_queue: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def offer(self, event: dict) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+
+class ChangeBroker:
+    """Fan change events out to the subscriptions of the user they belong to.
+
+    The last ``history_size`` events per user are kept so a client that
+    reconnects with ``Last-Event-ID`` receives what it missed. The history of
+    a user with no event for ``history_ttl`` seconds is dropped, as are the
+    least recently active ones beyond ``max_users``; such clients get a reset.
+    Subscribers whose queue fills up are dropped and must resynchronise with
+    a full fetch.
+    """
+
+    def __init__(
+        self,
+        history_size: int = 200,
+        max_queue: int = 100,
+        history_ttl: float = 3600.0,
+        max_users: int = 10_000,
+    ):
+        self.history_size = history_size
+        self.max_queue = max_queue
+        self.history_ttl = history_ttl
+        self.max_users = max_users
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        # user id -> (time of the last event, events), least recently active first
+        self._history: "OrderedDict[str, Tuple[float, deque]]" = OrderedDict()
+        self._listeners: List[Callable[[str, dict], None]] = []
+        self._seq = itertools.count(1)
+        # Ids from before a restart must never match events of this process
+        self._epoch = uuid.uuid4().hex[:8]
+
+    def next_id(self) -> str:
+        return f"{self._epoch}-{next(self._seq)}"
+
+    def add_listener(self, listener: Callable[[str, dict], None]):
+        """Call ``listener(user_id, event)`` for every published event, e.g. to update caches"""
+        self._listeners.append(listener)
+
+    def publish(self, user_id: str, event: dict):
+        """Deliver ``event``; it must carry an ``id`` usable as the SSE event id"""
+        for listener in self._listeners:
+            try:
+                listener(user_id, event)
+            except Exception:
+                logger.exception("Change listener failed")
+        now = time.monotonic()
+        _, history = self._history.pop(user_id, (now, None))
+        if history is None:
+            history = deque(maxlen=self.history_size)
+        history.append(event)
+        self._history[user_id] = (now, history)
+        self._evict_history(now)
+        for subscription in list(self._subscribers.get(user_id, ())):
+            if not subscription.offer(event):
+                self.unsubscribe(subscription)
+
+    def _evict_history(self, now: float):
+        while self._history:
+            touched, _ = next(iter(self._history.values()))
+            if len(self._history) <= self.max_users and now - touched < self.history_ttl:
+                return
+            self._history.popitem(last=False)
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscription = Subscription(user_id, self.max_queue)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def replay(self, user_id: str, last_event_id: str) -> Optional[List[dict]]:
+        """Events after ``last_event_id``, or None if it is no longer in history"""
+        _, history = self._history.get(user_id, (None, ()))
+        history = list(history)
+        for index, event in enumerate(history):
+            if event["id"] == last_event_id:
+                return history[index + 1:]
+        return None
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+# ==================== MONGO CHANGE STREAMS ====================
+
+def change_to_event(change: dict) -> Optional[dict]:
+    """Turn a change stream document into a compact feed event.
+
+    Update events carry only the changed fields. Deletes need the pre-image
+    to know which user owned the document; ``MongoChangeSource`` enables
+    ``changeStreamPreAndPostImages`` on its collections for that.
+    """
+    operation = change["operationType"]
+    collection = change["ns"]["coll"]
+    token = change["_id"]["_data"]
+
+    if operation == "delete":
+        before = change.get("fullDocumentBeforeChange")
+        if not before:
+            return None
+        return {"id": token, "user_id": before["user_id"], "collection": collection, "op": "delete", "doc_id": before["id"]}
+
+    document = change.get("fullDocument")
+    if not document:
+        return None  # Deleted again before the update could be looked up
+    if operation == "update":
+        data = dict(change["updateDescription"]["updatedFields"])
+        op = "update"
+    else:
+        data = {key: value for key, value in document.items() if key != "_id"}
+        op = "create" if operation == "insert" else "update"
+    data.pop("_id", None)
+    return {"id": token, "user_id": document["user_id"], "collection": collection, "op": op, "doc_id": document["id"], "data": data}
+
+
+# MongoDB error code for a collection that does not exist yet
+NAMESPACE_NOT_FOUND = 26
+
+
+class MongoChangeSource:
+    """Publish Mongo change stream events into a broker (replica sets only).
+
+    Deletes, including archival moves to cold collections, are only visible
+    with pre-images, so ``run`` first enables them on every watched
+    collection (MongoDB 6.0+, needs the collMod privilege). Without them
+    delete events are dropped and clients only catch up on their next reset.
+    """
+
+    def __init__(self, get_db: Callable[[], Any], broker: ChangeBroker, collections: Iterable[str]):
+        self.get_db = get_db
+        self.broker = broker
+        self.collections = list(collections)
+        self._task = None
+
+    @property
+    def pipeline(self) -> list:
+        return [{"$match": {
+            "ns.coll": {"$in": self.collections},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+
+    def watch(self, resume_after: Optional[str] = None):
+        return self.get_db().watch(
+            self.pipeline,
+            full_document="updateLookup",
+            full_document_before_change="whenAvailable",
+            resume_after={"_data": resume_after} if resume_after else None,
+        )
+
+    async def enable_pre_images(self):
+        db = self.get_db()
+        for name in self.collections:
+            try:
+                await db.command("collMod", name, changeStreamPreAndPostImages={"enabled": True})
+            except OperationFailure as e:
+                if e.code != NAMESPACE_NOT_FOUND:
+                    logger.warning("Could not enable pre-images on %s, its deletes will not be streamed: %s", name, e)
+                    continue
+                try:
+                    await db.create_collection(name, changeStreamPreAndPostImages={"enabled": True})
+                except CollectionInvalid:
+                    pass  # Created by another worker meanwhile, which also enabled pre-images
+
+    async def run(self):
+        try:
+            await self.enable_pre_images()
+        except PyMongoError as e:
+            logger.warning("Could not enable pre-images, deletes will not be streamed: %s", e)
+        resume_token = None
+        while True:
+            try:
+                async with self.watch(resume_token) as stream:
+                    async for change in stream:
+                        resume_token = change["_id"]["_data"]
+                        event = change_to_event(change)
+                        if event is not None:
+                            self.broker.publish(event.pop("user_id"), event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Change stream interrupted, resuming: %s", e)
+                await asyncio.sleep(1)
+
+    async def catch_up(self, user_id: str, resume_after: str) -> AsyncIterator[dict]:
+        """Yield this user's events after a resume token not in broker history"""
+        async with self.watch(resume_after) as stream:
+            while True:
+                change = await stream.try_next()
+                if change is None:
+                    return
+                event = change_to_event(change)
+                if event is not None and event.pop("user_id") == user_id:
+                    yield event
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+# ==================== SSE STREAM ====================
+
+async def event_stream(
+    broker: ChangeBroker,
+    user_id: str,
+    last_event_id: Optional[str] = None,
+    source: Optional[MongoChangeSource] = None,
+    heartbeat: float = 15.0,
+) -> AsyncIterator[bytes]:
+    """SSE body for one client: replay missed events, then stream live ones"""
+    # Subscribe before replaying so nothing published meanwhile is lost
+    subscription = broker.subscribe(user_id)
+    try:
+        yield b"retry: 3000\n\n"
+        seen = set()
+        if last_event_id:
+            missed = broker.replay(user_id, last_event_id)
+            if missed is None and source is not None:
+                try:
+                    missed = [event async for event in source.catch_up(user_id, last_event_id)]
+                except Exception as e:
+                    logger.info("Could not resume change feed from %s: %s", last_event_id, e)
+            if missed is None:
+                # Too far behind: the client has to refetch its lists
+                yield format_sse({"reason": "history_expired"}, event="reset")
+            else:
+                for event in missed:
+                    seen.add(event["id"])
+                    yield format_sse(event, event_id=event["id"])
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if subscription.overflowed:
+                    break
+                yield b": ping\n\n"
+                continue
+            if event["id"] in seen:
+                continue
+            yield format_sse(event, event_id=event["id"])
+            if subscription.overflowed and subscription.queue.empty():
+                break
+
+        yield format_sse({"reason": "slow_consumer"}, event="reset")
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,329 @@
+"""Compact document storage: the app id becomes ``_id`` as a binary UUID.
+
+Application code keeps using 36-character string ids in ``id``, ``user_id``,
+``host_id``, ``show_id`` and ``episode_id``. ``CompactDatabase`` translates at
+the database boundary: ids are stored as BSON binary subtype 4 (16 bytes),
+the app id doubles as ``_id`` so the separate ObjectId and its own index go
+away, and filters, updates, projections and sorts on ``id`` are rewritten to
+``_id``. Values that are not UUIDs are stored unchanged.
+
+Documents read back carry ``id`` exactly when the projection asked for it
+(or had no inclusion list), as they would without compact storage.
+Collections whose documents have no ``id`` (waveforms) keep their ObjectId
+``_id`` and only have their reference fields stored as binary.
+"""
+import uuid
+from typing import Any, Iterable, Optional
+
+from bson.binary import Binary, UUID_SUBTYPE
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+UUID_FIELDS = frozenset({"user_id", "host_id", "show_id", "episode_id"})
+LOGICAL_OPERATORS = frozenset({"$and", "$or", "$nor"})
+# Comparison operators whose operands are ids; anything else is left alone
+ID_OPERATORS = frozenset({"$eq", "$ne", "$in", "$nin"})
+ID_UPDATE_OPERATORS = frozenset({"$set", "$setOnInsert"})
+
+
+def to_binary(value):
+    if isinstance(value, str):
+        try:
+            return Binary.from_uuid(uuid.UUID(value))
+        except ValueError:
+            return value
+    if isinstance(value, list):
+        return [to_binary(item) for item in value]
+    return value
+
+
+def from_binary(value):
+    if isinstance(value, Binary) and value.subtype == UUID_SUBTYPE:
+        return str(value.as_uuid())
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, list):
+        return [from_binary(item) for item in value]
+    return value
+
+
+def encode_condition(condition):
+    if isinstance(condition, dict):
+        return {op: to_binary(operand) if op in ID_OPERATORS else operand for op, operand in condition.items()}
+    return to_binary(condition)
+
+
+def encode_filter(query: Optional[dict]) -> Optional[dict]:
+    if not query:
+        return query
+    encoded = {}
+    for key, value in query.items():
+        if key in LOGICAL_OPERATORS:
+            encoded[key] = [encode_filter(clause) for clause in value]
+        elif key == "id":
+            encoded["_id"] = encode_condition(value)
+        elif key in UUID_FIELDS:
+            encoded[key] = encode_condition(value)
+        else:
+            encoded[key] = value
+    return encoded
+
+
+def encode_document(doc: dict) -> dict:
+    encoded = {key: to_binary(value) if key in UUID_FIELDS else value for key, value in doc.items() if key != "_id"}
+    if "id" in encoded:
+        encoded["_id"] = to_binary(encoded.pop("id"))
+    elif "_id" in doc:
+        encoded["_id"] = doc["_id"]
+    return encoded
+
+
+def encode_update(update: dict) -> dict:
+    encoded = {}
+    for op, fields in update.items():
+        if op in ID_UPDATE_OPERATORS:
+            fields = {key: to_binary(value) if key in UUID_FIELDS else value for key, value in fields.items()}
+        encoded[op] = fields
+    return encoded
+
+
+def encode_projection(projection):
+    """``_id`` always comes back since it carries the id; requests for ``id`` map onto it"""
+    if not isinstance(projection, dict):
+        return projection
+    encoded = {("_id" if key == "id" else key): value for key, value in projection.items() if key != "_id"}
+    return encoded or None
+
+
+def projects_id(projection) -> bool:
+    """Whether ``projection`` (before encoding) returns the ``id`` field"""
+    if projection is None:
+        return True
+    if isinstance(projection, dict):
+        fields = {key: value for key, value in projection.items() if key != "_id"}
+        if "id" in fields:
+            return bool(fields["id"])
+        return not any(fields.values())  # An exclusion list keeps everything else
+    return "id" in projection
+
+
+def encode_sort(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return ("_id" if key_or_list == "id" else key_or_list), direction
+    return [("_id" if key == "id" else key, order) for key, order in key_or_list], None
+
+
+def encode_keys(keys):
+    """Index hints and bulk sorts: field names mapped like sorts, index names kept"""
+    if isinstance(keys, str) or keys is None:
+        return keys
+    if isinstance(keys, dict):
+        return {("_id" if key == "id" else key): order for key, order in keys.items()}
+    return encode_sort(keys)[0]
+
+
+def decode_document(doc: Optional[dict], include_id: bool = True) -> Optional[dict]:
+    if doc is None:
+        return None
+    decoded = {}
+    if include_id and "_id" in doc and "id" not in doc:
+        identifier = from_binary(doc["_id"])
+        if isinstance(identifier, str):
+            decoded["id"] = identifier
+    for key, value in doc.items():
+        if key == "_id":
+            continue
+        decoded[key] = from_binary(value) if key in UUID_FIELDS else value
+    return decoded
+
+
+def operation_options(operation, *names: str) -> dict:
+    """The optional settings a bulk request was built with, keys encoded"""
+    options = {}
+    for name in names:
+        # pymongo keeps request settings only in these private slots
+        value = getattr(operation, f"_{name}", None)
+        if value is not None:
+            options[name] = encode_keys(value) if name in ("hint", "sort") else value
+    return options
+
+
+def encode_operation(operation):
+    """Rebuild a bulk_write request with encoded filter and document, keeping its options"""
+    if isinstance(operation, InsertOne):
+        return InsertOne(encode_document(operation._doc), **operation_options(operation, "namespace"))
+    if isinstance(operation, ReplaceOne):
+        return ReplaceOne(
+            encode_filter(operation._filter),
+            encode_document(operation._doc),
+            upsert=operation._upsert,
+            **operation_options(operation, "collation", "hint", "namespace", "sort"),
+        )
+    if isinstance(operation, (UpdateOne, UpdateMany)):
+        names = ("collation", "array_filters", "hint", "namespace")
+        if isinstance(operation, UpdateOne):
+            names += ("sort",)
+        return type(operation)(
+            encode_filter(operation._filter),
+            encode_update(operation._doc),
+            upsert=operation._upsert,
+            **operation_options(operation, *names),
+        )
+    if isinstance(operation, (DeleteOne, DeleteMany)):
+        return type(operation)(
+            encode_filter(operation._filter), **operation_options(operation, "collation", "hint", "namespace")
+        )
+    raise TypeError(f"Unsupported bulk operation {type(operation).__name__}")
+
+
+class CompactCursor:
+    def __init__(self, cursor, include_id: bool = True):
+        self._cursor = cursor
+        self._include_id = include_id
+
+    def sort(self, key_or_list, direction=None):
+        key_or_list, direction = encode_sort(key_or_list, direction)
+        if direction is None:
+            self._cursor = self._cursor.sort(key_or_list)
+        else:
+            self._cursor = self._cursor.sort(key_or_list, direction)
+        return self
+
+    def limit(self, limit: int):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def skip(self, skip: int):
+        self._cursor = self._cursor.skip(skip)
+        return self
+
+    async def to_list(self, length: Optional[int] = None):
+        return [decode_document(doc, self._include_id) for doc in await self._cursor.to_list(length)]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return decode_document(await self._cursor.__anext__(), self._include_id)
+
+
+class CompactCollection:
+    """Collection proxy converting between the API's documents and compact storage"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, filter: Optional[dict] = None, projection=None, *args, **kwargs) -> CompactCursor:
+        projection = kwargs.pop("projection", projection)
+        cursor = self._collection.find(encode_filter(filter or {}), encode_projection(projection), *args, **kwargs)
+        return CompactCursor(cursor, projects_id(projection))
+
+    async def find_one(self, filter: Optional[dict] = None, projection=None, *args, **kwargs):
+        projection = kwargs.pop("projection", projection)
+        doc = await self._collection.find_one(encode_filter(filter or {}), encode_projection(projection), *args, **kwargs)
+        return decode_document(doc, projects_id(projection))
+
+    async def find_one_and_update(self, filter: dict, update: dict, projection=None, *args, **kwargs):
+        projection = kwargs.pop("projection", projection)
+        doc = await self._collection.find_one_and_update(
+            encode_filter(filter), encode_update(update), encode_projection(projection), *args, **kwargs
+        )
+        return decode_document(doc, projects_id(projection))
+
+    async def insert_one(self, document: dict, *args, **kwargs):
+        return await self._collection.insert_one(encode_document(document), *args, **kwargs)
+
+    async def insert_many(self, documents: Iterable[dict], *args, **kwargs):
+        return await self._collection.insert_many([encode_document(doc) for doc in documents], *args, **kwargs)
+
+    async def replace_one(self, filter: dict, replacement: dict, *args, **kwargs):
+        return await self._collection.replace_one(encode_filter(filter), encode_document(replacement), *args, **kwargs)
+
+    async def update_one(self, filter: dict, update: dict, *args, **kwargs):
+        return await self._collection.update_one(encode_filter(filter), encode_update(update), *args, **kwargs)
+
+    async def update_many(self, filter: dict, update: dict, *args, **kwargs):
+        return await self._collection.update_many(encode_filter(filter), encode_update(update), *args, **kwargs)
+
+    async def delete_one(self, filter: dict, *args, **kwargs):
+        return await self._collection.delete_one(encode_filter(filter), *args, **kwargs)
+
+    async def delete_many(self, filter: dict, *args, **kwargs):
+        return await self._collection.delete_many(encode_filter(filter), *args, **kwargs)
+
+    async def count_documents(self, filter: dict, *args, **kwargs):
+        return await self._collection.count_documents(encode_filter(filter), *args, **kwargs)
+
+    async def bulk_write(self, requests, *args, **kwargs):
+        return await self._collection.bulk_write([encode_operation(op) for op in requests], *args, **kwargs)
+
+    async def create_index(self, keys, *args, **kwargs):
+        if keys == "id" or keys == [("id", 1)]:
+            return "_id_"  # _id is the id and is unique already
+        return await self._collection.create_index(keys, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+class CompactChangeStream:
+    """Change stream wrapper decoding the documents inside each event"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    @staticmethod
+    def decode(change: Optional[dict]) -> Optional[dict]:
+        if change is None:
+            return None
+        for key in ("fullDocument", "fullDocumentBeforeChange", "documentKey"):
+            if change.get(key):
+                change[key] = decode_document(change[key])
+        description = change.get("updateDescription")
+        if description and description.get("updatedFields"):
+            description["updatedFields"] = decode_document(description["updatedFields"])
+        return change
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._stream.__aexit__(*exc_info)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return self.decode(await self._stream.__anext__())
+
+    async def try_next(self):
+        return self.decode(await self._stream.try_next())
+
+
+class CompactDatabase:
+    """Database proxy handing out CompactCollections for ``collections``; others pass through"""
+
+    def __init__(self, database, collections: Iterable[str]):
+        self._database = database
+        self._collections = frozenset(collections)
+        self._proxies = {}
+
+    def _wrap(self, name: str, collection):
+        if name not in self._collections:
+            return collection
+        proxy = self._proxies.get(name)
+        if proxy is None:
+            proxy = self._proxies[name] = CompactCollection(collection)
+        return proxy
+
+    def watch(self, *args, **kwargs) -> CompactChangeStream:
+        return CompactChangeStream(self._database.watch(*args, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._database, name)
+        if name in self._collections:
+            return self._wrap(name, attribute)
+        return attribute
+
+    def __getitem__(self, name: str):
+        return self._wrap(name, self._database[name])
@@ -0,0 +1,62 @@
+# Production launcher config: gunicorn managing uvicorn workers
+# Usage: cd backend && gunicorn server:app -c gunicorn.conf.py
+import os
+
+
+def available_cores() -> int:
+    # Respect CPU affinity / container limits where the platform exposes them
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# One async worker per core is enough for an I/O bound API; MAX_WORKERS keeps
+# small instances from being oversubscribed on memory when the host reports
+# many cores. WEB_CONCURRENCY overrides the computed value.
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '4'))
+workers = int(os.environ.get('WEB_CONCURRENCY', min(available_cores(), MAX_WORKERS)))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# Only a proxy on this host may set the client address through X-Forwarded-For;
+# trusting '*' would let any client pick its own IP. Render's proxies have no
+# fixed addresses, so there the rate limiter reads the header itself and
+# trusts only the entry Render appended (RATE_LIMIT_PROXY_HOPS=1).
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+# Each worker opens its own Motor client in the app lifespan, so the app must
+# not be imported before the fork
+preload_app = False
+
+# On SIGTERM workers stop accepting, finish in-flight requests for up to
+# graceful_timeout seconds, then run the lifespan shutdown that closes Mongo
+timeout = int(os.environ.get('WORKER_TIMEOUT', '60'))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('KEEPALIVE', '5'))
+
+# Recycle workers periodically, jittered so they do not restart together
+max_requests = int(os.environ.get('MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', '1000'))
+
+accesslog = '-'
+errorlog = '-'
+
+if workers > 1:
+    # A write handled by one worker must invalidate ETags handed out by another
+    os.environ.setdefault('CONDITIONAL_GET_STORE', 'mongo')
+    # Locally published change events only reach clients streaming from the
+    # worker that handled the write; change streams reach every worker
+    os.environ.setdefault('CHANGE_FEED_SOURCE', 'mongo')
+    # Read-after-write pins must be visible to the worker serving the next read
+    os.environ.setdefault('READ_PIN_STORE', 'mongo')
+
+
+def on_starting(server):
+    if workers > 1 and os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true':
+        # Buffered updates are only overlaid on reads served by the same worker
+        server.log.warning(
+            "WRITE_BEHIND_ENABLED with %d workers: a read served by another worker may "
+            "return a document from before an edit for up to WRITE_BEHIND_WINDOW_MS",
+            workers,
+        )
@@ -0,0 +1,307 @@
+"""Response compression and conditional GET support for the JSON API."""
+import asyncio
+import contextvars
+import gzip
+import hashlib
+import logging
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Shared version bumps started by the current request, awaited before it responds
+_pending_bumps: contextvars.ContextVar[Optional[List[asyncio.Task]]] = contextvars.ContextVar("pending_bumps", default=None)
+
+
+# ==================== COMPRESSION ====================
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each encoding in an Accept-Encoding header to its q-value"""
+    accepted = {}
+    for part in header.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+class CompressionMiddleware:
+    """Compress buffered responses with brotli or gzip above a size threshold.
+
+    Only the content types listed in ``content_types`` are compressed, so
+    streamed responses such as uploads or event streams pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        encodings: Iterable[str] = ("br", "gzip"),
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        content_types: Iterable[str] = ("application/json",),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = [e for e in encodings if e == "gzip" or (e == "br" and brotli is not None)]
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.content_types = tuple(content_types)
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get('*', 0.0))
+            if quality > 0:
+                return encoding
+        return None
+
+    def compress(self, encoding: str, payload: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(payload, quality=self.brotli_quality)
+        return gzip.compress(payload, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        buffering = False
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start_message, buffering
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                buffering = (
+                    content_type.startswith(self.content_types)
+                    and "content-encoding" not in headers
+                )
+                if not buffering:
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or not buffering:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            payload = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(payload) >= self.minimum_size:
+                payload = self.compress(encoding, payload)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(payload))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": payload})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# ==================== CONDITIONAL GET ====================
+
+class MongoVersionStore:
+    """Collection versions shared by every worker and instance through a Mongo collection.
+
+    One document per user holds a counter per collection, so checking an ETag
+    costs one primary lookup by _id. Lookups must read from the primary.
+    """
+
+    def __init__(self, get_collection: Callable[[], Any]):
+        # Resolved per call because the Mongo client is created in the app lifespan
+        self.get_collection = get_collection
+
+    async def get(self, user_id: str, collection: str) -> int:
+        doc = await self.get_collection().find_one({"_id": user_id}, {collection: 1})
+        return (doc or {}).get(collection, 0)
+
+    async def bump(self, user_id: str, collections: Tuple[str, ...]):
+        await self.get_collection().update_one(
+            {"_id": user_id}, {"$inc": {collection: 1 for collection in collections}}, upsert=True
+        )
+
+
+class CollectionVersions:
+    """Per-user change counters for each collection.
+
+    Every write bumps the counter of the collections it touches, so a weak
+    ETag derived from the counter changes exactly when a list could have
+    changed. Without a ``store`` counters live in this process and the epoch
+    is regenerated per process, which keeps ETags handed out before a restart
+    from ever matching again. With a ``store`` every worker reads the same
+    durable counters; the write's response waits for its bump, so the next
+    read sees the new version whichever worker serves it.
+    """
+
+    def __init__(self, store: Optional[MongoVersionStore] = None):
+        self.store = store
+        self.epoch = "shared" if store is not None else uuid.uuid4().hex
+        self._versions: Dict[Tuple[str, str], int] = {}
+
+    async def get(self, user_id: str, collection: str) -> int:
+        if self.store is not None:
+            return await self.store.get(user_id, collection)
+        return self._versions.get((user_id, collection), 0)
+
+    def bump(self, user_id: str, *collections: str):
+        if self.store is not None:
+            task = asyncio.create_task(self._share_bump(user_id, collections))
+            pending = _pending_bumps.get()
+            if pending is not None:
+                pending.append(task)
+            return
+        for collection in collections:
+            key = (user_id, collection)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    async def _share_bump(self, user_id: str, collections: Tuple[str, ...]):
+        try:
+            await self.store.bump(user_id, collections)
+        except PyMongoError as e:
+            logger.warning("Could not bump versions of %s for %s: %s", ", ".join(collections), user_id, e)
+
+    async def etag(self, user_id: str, collection: str, resource: str) -> Optional[str]:
+        """The current ETag, or None when the shared version cannot be read"""
+        try:
+            version = await self.get(user_id, collection)
+        except PyMongoError as e:
+            logger.warning("Could not read versions for %s: %s", user_id, e)
+            return None
+        raw = f"{self.epoch}:{user_id}:{collection}:{version}:{resource}"
+        return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison: ignore the W/ prefix on both sides
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+class ConditionalGetMiddleware:
+    """Answer GETs on versioned collections with 304 when nothing changed.
+
+    ``user_id_resolver`` maps the Authorization header to a user id without
+    touching the database (the JWT subject), so a matching If-None-Match is
+    answered before any handler or Mongo query runs.
+    """
+
+    def __init__(
+        self,
+        app,
+        versions: CollectionVersions,
+        user_id_resolver: Callable[[str], Optional[str]],
+        collections: Iterable[str],
+        prefix: str = "/api/",
+    ):
+        self.app = app
+        self.versions = versions
+        self.user_id_resolver = user_id_resolver
+        self.collections = set(collections)
+        self.prefix = prefix
+
+    def collection_for(self, path: str) -> Optional[str]:
+        if not path.startswith(self.prefix):
+            return None
+        collection = path[len(self.prefix):].split('/', 1)[0]
+        return collection if collection in self.collections else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            if self.versions.store is None or scope["method"] == "OPTIONS":
+                await self.app(scope, receive, send)
+            else:
+                await self.call_writing(scope, receive, send)
+            return
+
+        collection = self.collection_for(scope["path"])
+        if collection is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        user_id = self.user_id_resolver(headers.get("authorization", ""))
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Read the version before the handler runs: a write racing with this
+        # request then yields an older ETag, which only costs a refetch later
+        resource = scope["path"] + "?" + scope.get("query_string", b"").decode("latin-1")
+        etag = await self.versions.etag(user_id, collection, resource)
+        if etag is None:
+            await self.app(scope, receive, send)
+            return
+
+        if etag_matches(headers.get("if-none-match", ""), etag):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [
+                    (b"etag", etag.encode()),
+                    (b"cache-control", b"private, no-cache"),
+                    (b"vary", b"Authorization"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                response_headers = MutableHeaders(raw=message["headers"])
+                response_headers["ETag"] = etag
+                response_headers["Cache-Control"] = "private, no-cache"
+                response_headers.add_vary_header("Authorization")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def call_writing(self, scope, receive, send):
+        """Hold the response until the shared version bumps of this request's writes are stored"""
+        pending: List[asyncio.Task] = []
+        token = _pending_bumps.set(pending)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and pending:
+                await asyncio.gather(*pending)
+                pending.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _pending_bumps.reset(token)
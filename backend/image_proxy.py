@@ -0,0 +1,336 @@
+"""Caching proxy for remote images with a size-bounded on-disk LRU."""
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_REDIRECTS = 3
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# Scriptable image types are never proxied: they would run on the API's origin
+BLOCKED_CONTENT_TYPES = ("image/svg+xml",)
+# Served entries get their mtime bumped at most this often; it is the shared LRU clock
+TOUCH_INTERVAL = 3600.0
+
+
+class ImageProxyError(Exception):
+    """The image cannot be proxied; ``status_code`` is what the client should see"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class CachedImage:
+    __slots__ = ("key", "path", "content_type", "etag", "fetched_at", "origin_etag", "origin_last_modified")
+
+    def __init__(self, key: str, path: Path, meta: dict):
+        self.key = key
+        self.path = path
+        self.content_type = meta["content_type"]
+        self.etag = meta["etag"]
+        self.fetched_at = meta["fetched_at"]
+        self.origin_etag = meta.get("origin_etag")
+        self.origin_last_modified = meta.get("origin_last_modified")
+
+    def read(self) -> bytes:
+        return self.path.read_bytes()
+
+
+class ImageCache:
+    """Remote images stored as ``<sha256(url)>.img`` plus a JSON sidecar.
+
+    Entries younger than ``fresh_seconds`` are served as is. Older ones are
+    still served while a background conditional request refreshes them, so
+    an expired or slow origin never blocks a page. The total size is kept
+    under ``max_bytes`` by evicting the least recently served entries.
+
+    The directory may be shared by several workers. The files on disk are the
+    source of truth: entries stored by another worker are picked up on a
+    miss, serving an entry bumps its mtime (the LRU order every worker sees),
+    and the index is rebuilt from disk every ``rescan_seconds`` before
+    evicting, so the bound holds for the directory as a whole.
+
+    Only public addresses are fetched unless ``allow_private`` is set, and
+    the connection goes to the address that was checked, so DNS cannot
+    rebind the host to a private one between the check and the request.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int,
+        fresh_seconds: float = 86400.0,
+        max_image_bytes: int = 10 * 1024 * 1024,
+        timeout: float = 10.0,
+        allowed_hosts: Iterable[str] = (),
+        allow_private: bool = False,
+        rescan_seconds: float = 60.0,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.max_image_bytes = max_image_bytes
+        self.timeout = timeout
+        self.allowed_hosts = {host.lower() for host in allowed_hosts}
+        self.allow_private = allow_private
+        self.rescan_seconds = rescan_seconds
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._total = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._scanned_at = 0.0
+        self._fetches: Dict[str, asyncio.Task] = {}
+        self._client = None
+
+    # ---- disk index ----
+    # The index (_sizes, _total, _touched) is only changed on the event loop;
+    # the methods run in threads read and write files and nothing else.
+
+    def _scan(self) -> List[Tuple[str, int]]:
+        """Keys and sizes of the entries on disk, least recently served first"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for image_path in self.directory.glob("*.img"):
+            try:
+                if not image_path.with_suffix(".json").exists():
+                    image_path.unlink(missing_ok=True)
+                    continue
+                stat = image_path.stat()
+            except OSError:
+                continue  # Evicted by another worker meanwhile
+            entries.append((stat.st_mtime, image_path.stem, stat.st_size))
+        return [(key, size) for _, key, size in sorted(entries)]
+
+    def _index(self, entries: List[Tuple[str, int]]) -> List[str]:
+        """Replace the index with scanned ``entries``; returns the keys to evict"""
+        self._sizes = OrderedDict(entries)
+        self._total = sum(self._sizes.values())
+        self._scanned_at = time.monotonic()
+        self._loaded = True
+        return self._evict()
+
+    async def load(self):
+        """Rebuild the LRU order from the files on disk"""
+        evicted = self._index(await asyncio.to_thread(self._scan))
+        if evicted:
+            await asyncio.to_thread(self._delete, evicted)
+
+    def _paths(self, key: str):
+        return self.directory / f"{key}.img", self.directory / f"{key}.json"
+
+    def _evict(self) -> List[str]:
+        """Drop least recently served entries from the index until under the bound"""
+        evicted = []
+        while self._total > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            self._touched.pop(key, None)
+            evicted.append(key)
+        return evicted
+
+    def _delete(self, keys: Iterable[str]):
+        for key in keys:
+            for path in self._paths(key):
+                path.unlink(missing_ok=True)
+
+    def _lookup(self, key: str) -> Optional[CachedImage]:
+        image_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+            if key not in self._sizes:
+                # Stored by another worker sharing the directory
+                self._sizes[key] = image_path.stat().st_size
+                self._total += self._sizes[key]
+        except (OSError, ValueError):
+            self._total -= self._sizes.pop(key, 0)
+            return None
+        self._sizes.move_to_end(key)
+        now = time.time()
+        if now - self._touched.get(key, 0.0) > TOUCH_INTERVAL:
+            self._touched[key] = now
+            try:
+                os.utime(image_path)
+            except OSError:
+                pass
+        return CachedImage(key, image_path, meta)
+
+    def _write(self, key: str, body: bytes, meta: dict):
+        # Write then rename, so readers never see a partial file
+        for path, data in zip(self._paths(key), (body, json.dumps(meta).encode())):
+            tmp_path = path.with_suffix(path.suffix + ".tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+
+    async def _store(self, key: str, body: bytes, meta: dict) -> CachedImage:
+        await asyncio.to_thread(self._write, key, body, meta)
+        self._total += len(body) - self._sizes.pop(key, 0)
+        self._sizes[key] = len(body)
+        self._touched[key] = time.time()
+        if time.monotonic() - self._scanned_at > self.rescan_seconds:
+            await self.load()  # Count what other workers stored before evicting
+        else:
+            evicted = self._evict()
+            if evicted:
+                await asyncio.to_thread(self._delete, evicted)
+        return CachedImage(key, self._paths(key)[0], meta)
+
+    def _touch(self, key: str, meta_update: dict) -> Optional[CachedImage]:
+        image_path, meta_path = self._paths(key)
+        try:
+            meta = {**json.loads(meta_path.read_text()), **meta_update}
+        except (OSError, ValueError):
+            return None
+        meta_path.write_text(json.dumps(meta))
+        return CachedImage(key, image_path, meta)
+
+    # ---- origin ----
+
+    def _client_instance(self):
+        if self._client is None:
+            import httpx  # Slow to import; only needed once an image misses the cache
+
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=False,
+                headers={"User-Agent": "podcast-image-proxy/1.0"},
+                # Connections are made to pinned addresses; never reuse one for another host
+                limits=httpx.Limits(max_keepalive_connections=0),
+            )
+        return self._client
+
+    async def _check_url(self, url: str) -> Tuple[str, Optional[str]]:
+        """Validate ``url``; returns its host and the checked address to connect to"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ImageProxyError(400, "Only http(s) image URLs can be proxied")
+        host = parts.hostname.lower()
+        if self.allowed_hosts and host not in self.allowed_hosts:
+            raise ImageProxyError(403, "Image host is not allowed")
+        if self.allow_private:
+            return host, None
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port or 443, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            raise ImageProxyError(502, "Image host could not be resolved")
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0])
+            if not address.is_global:
+                raise ImageProxyError(403, "Image host is not public")
+        return host, infos[0][4][0]
+
+    async def _fetch(self, url: str, headers: Optional[dict] = None):
+        """GET ``url`` following a few redirects, checking every hop"""
+        client = self._client_instance()
+        for _ in range(MAX_REDIRECTS + 1):
+            host, address = await self._check_url(url)
+            request = client.build_request("GET", url, headers=headers)
+            if address is not None:
+                # Keep the Host header and TLS name of the URL but connect to the checked address
+                request.url = request.url.copy_with(host=address)
+                request.extensions["sni_hostname"] = host
+            response = await client.send(request, stream=True)
+            if response.status_code in REDIRECT_STATUSES and "location" in response.headers:
+                await response.aclose()
+                url = urljoin(url, response.headers["location"])
+                continue
+            try:
+                if response.status_code == 304:
+                    return response, None
+                if response.status_code != 200:
+                    raise ImageProxyError(502, f"Origin answered {response.status_code}")
+                content_type = response.headers.get("content-type", "").lower()
+                if not content_type.startswith("image/"):
+                    raise ImageProxyError(502, "Origin did not return an image")
+                if content_type.startswith(BLOCKED_CONTENT_TYPES):
+                    raise ImageProxyError(415, "SVG images are not proxied")
+                declared = response.headers.get("content-length")
+                if declared and declared.isdigit() and int(declared) > self.max_image_bytes:
+                    raise ImageProxyError(502, "Image is too large")
+                chunks, size = [], 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        raise ImageProxyError(502, "Image is too large")
+                    chunks.append(chunk)
+                return response, b"".join(chunks)
+            finally:
+                await response.aclose()
+        raise ImageProxyError(502, "Too many redirects")
+
+    async def _download(self, key: str, url: str) -> CachedImage:
+        import httpx
+
+        try:
+            response, body = await self._fetch(url)
+        except httpx.HTTPError as e:
+            raise ImageProxyError(502, f"Could not fetch image: {e.__class__.__name__}")
+        return await self._save(key, url, response, body)
+
+    async def _revalidate(self, key: str, url: str, cached: CachedImage):
+        headers = {}
+        if cached.origin_etag:
+            headers["If-None-Match"] = cached.origin_etag
+        if cached.origin_last_modified:
+            headers["If-Modified-Since"] = cached.origin_last_modified
+        try:
+            response, body = await self._fetch(url, headers=headers)
+            if body is None:
+                await asyncio.to_thread(self._touch, key, {"fetched_at": time.time()})
+            else:
+                await self._save(key, url, response, body)
+        except Exception as e:
+            # Keep serving the stale copy; the origin may be down or the URL expired
+            logger.info("Revalidating image %s failed: %s", url, e)
+
+    async def _save(self, key: str, url: str, response, body: bytes) -> CachedImage:
+        meta = {
+            "url": url,
+            "content_type": response.headers["content-type"],
+            "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            "fetched_at": time.time(),
+            "origin_etag": response.headers.get("etag"),
+            "origin_last_modified": response.headers.get("last-modified"),
+        }
+        return await self._store(key, body, meta)
+
+    def _single_flight(self, key: str, coroutine) -> asyncio.Task:
+        task = self._fetches.get(key)
+        if task is None:
+            task = self._fetches[key] = asyncio.create_task(coroutine)
+            task.add_done_callback(lambda _: self._fetches.pop(key, None))
+        else:
+            coroutine.close()
+        return task
+
+    async def get(self, url: str) -> CachedImage:
+        if not self._loaded:
+            async with self._load_lock:
+                if not self._loaded:
+                    await self.load()
+        key = hashlib.sha256(url.encode()).hexdigest()
+        cached = self._lookup(key)
+        if cached is None:
+            # Concurrent misses for the same URL share one download
+            return await asyncio.shield(self._single_flight(key, self._download(key, url)))
+        if time.time() - cached.fetched_at > self.fresh_seconds:
+            self._single_flight(key, self._revalidate(key, url, cached))
+        return cached
+
+    async def close(self):
+        for task in list(self._fetches.values()):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,219 @@
+"""Background probing of uploaded episode media: technical metadata and waveform peaks."""
+import asyncio
+import logging
+import math
+import shutil
+import subprocess
+import wave
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional
+
+# mutagen and numpy are imported where they are used: both are slow to import
+# and only needed once a media file is actually probed
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# mutagen file types whose stream info does not name the codec itself
+CODECS_BY_FORMAT = {
+    "MP3": "mp3",
+    "EasyMP3": "mp3",
+    "FLAC": "flac",
+    "OggVorbis": "vorbis",
+    "OggOpus": "opus",
+    "WAVE": "pcm",
+    "AAC": "aac",
+    "AIFF": "pcm",
+}
+
+# Decoded sample rate for waveforms; peaks for a player need far less than 44.1 kHz
+WAVEFORM_SAMPLE_RATE = 8000
+READ_CHUNK_FRAMES = 64 * 1024
+
+
+def probe_media(path: Path) -> Optional[dict]:
+    """Read duration, bitrate and codec from container headers without decoding"""
+    import mutagen
+
+    media = mutagen.File(path)
+    if media is None or media.info is None:
+        return None
+    info = media.info
+    bitrate = getattr(info, "bitrate", None)
+    return {
+        "duration_seconds": round(info.length, 3),
+        "bitrate": int(bitrate) if bitrate else None,
+        "codec": getattr(info, "codec", None) or CODECS_BY_FORMAT.get(type(media).__name__, type(media).__name__.lower()),
+        "sample_rate": getattr(info, "sample_rate", None),
+        "channels": getattr(info, "channels", None),
+        "mime_type": media.mime[0] if media.mime else None,
+        "file_size_bytes": path.stat().st_size,
+    }
+
+
+class PeakAccumulator:
+    """Reduce a stream of samples to ``buckets`` absolute peaks in constant memory"""
+
+    def __init__(self, total_samples: int, buckets: int):
+        import numpy as np
+
+        self.samples_per_bucket = max(1, math.ceil(total_samples / buckets))
+        self.peaks = np.zeros(buckets, dtype=np.float32)
+        self.position = 0
+
+    def add(self, samples: "np.ndarray"):
+        import numpy as np
+
+        if not len(samples):
+            return
+        indexes = (self.position + np.arange(len(samples))) // self.samples_per_bucket
+        indexes = np.minimum(indexes, len(self.peaks) - 1)
+        np.maximum.at(self.peaks, indexes, np.abs(samples))
+        self.position += len(samples)
+
+    def result(self) -> List[float]:
+        peaks = self.peaks
+        loudest = float(peaks.max()) if len(peaks) else 0.0
+        if loudest > 0:
+            peaks = peaks / loudest
+        return [round(float(peak), 3) for peak in peaks]
+
+
+def pcm_to_mono(frames: bytes, sample_width: int, channels: int) -> "np.ndarray":
+    import numpy as np
+
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported sample width {sample_width}")
+    if channels > 1:
+        samples = np.abs(samples[: len(samples) // channels * channels].reshape(-1, channels)).max(axis=1)
+    return samples
+
+
+def wav_peaks(path: Path, buckets: int) -> List[float]:
+    with wave.open(str(path), "rb") as reader:
+        accumulator = PeakAccumulator(reader.getnframes(), buckets)
+        while True:
+            frames = reader.readframes(READ_CHUNK_FRAMES)
+            if not frames:
+                break
+            accumulator.add(pcm_to_mono(frames, reader.getsampwidth(), reader.getnchannels()))
+    return accumulator.result()
+
+
+def ffmpeg_peaks(path: Path, duration_seconds: float, buckets: int) -> List[float]:
+    """Decode to low-rate mono PCM through ffmpeg and stream it into the accumulator"""
+    accumulator = PeakAccumulator(int(duration_seconds * WAVEFORM_SAMPLE_RATE) or 1, buckets)
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-i", str(path), "-vn", "-ac", "1", "-ar", str(WAVEFORM_SAMPLE_RATE),
+         "-f", "s16le", "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            chunk = process.stdout.read(READ_CHUNK_FRAMES * 2)
+            if not chunk:
+                break
+            accumulator.add(pcm_to_mono(chunk[: len(chunk) // 2 * 2], 2, 1))
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with status {process.returncode}")
+    return accumulator.result()
+
+
+def compute_peaks(path: Path, probe: dict, buckets: int) -> Optional[List[float]]:
+    """Waveform peaks normalised to 0..1, or None when the format cannot be decoded here"""
+    if probe["codec"] == "pcm" and path.suffix.lower() == ".wav":
+        return wav_peaks(path, buckets)
+    if shutil.which("ffmpeg"):
+        return ffmpeg_peaks(path, probe["duration_seconds"], buckets)
+    return None
+
+
+def analyze(path: Path, buckets: int) -> Optional[dict]:
+    probe = probe_media(path)
+    if probe is None:
+        return None
+    try:
+        peaks = compute_peaks(path, probe, buckets)
+    except Exception as e:
+        logger.warning("Could not compute waveform for %s: %s", path.name, e)
+        peaks = None
+    return {"probe": probe, "peaks": peaks}
+
+
+class MediaProbeWorker:
+    """Probe episode media from a queue with a bounded number of concurrent jobs.
+
+    Probing and waveform decoding block, so each job runs in a thread; at most
+    ``concurrency`` run at once and an episode already queued is not queued
+    again. ``on_probed(episode_id, media_url, result)`` stores the outcome.
+    """
+
+    def __init__(
+        self,
+        on_probed: Callable[[str, str, dict], Awaitable[None]],
+        concurrency: int = 2,
+        buckets: int = 800,
+        max_queue: int = 1000,
+    ):
+        self.on_probed = on_probed
+        self.concurrency = concurrency
+        self.buckets = buckets
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._queued: Dict[str, str] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(self, episode_id: str, media_url: str, path: Path) -> bool:
+        if self._queued.get(episode_id) == media_url:
+            return True
+        try:
+            self._queue.put_nowait((episode_id, media_url, path))
+        except asyncio.QueueFull:
+            logger.warning("Media probe queue full, skipping episode %s", episode_id)
+            return False
+        self._queued[episode_id] = media_url
+        return True
+
+    async def _work(self):
+        while True:
+            episode_id, media_url, path = await self._queue.get()
+            try:
+                if self._queued.get(episode_id) != media_url:
+                    continue  # Superseded by a newer upload for the same episode
+                result = await asyncio.to_thread(analyze, path, self.buckets)
+                if result is None:
+                    logger.info("Unrecognised media for episode %s: %s", episode_id, path.name)
+                    continue
+                result["probe"]["probed_at"] = datetime.now(timezone.utc).isoformat()
+                await self.on_probed(episode_id, media_url, result)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Probing media for episode %s failed", episode_id)
+            finally:
+                if self._queued.get(episode_id) == media_url:
+                    del self._queued[episode_id]
+                self._queue.task_done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._queued)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
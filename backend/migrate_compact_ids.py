@@ -0,0 +1,103 @@
+"""Convert stored documents to compact storage, or back with --reverse.
+
+Usage (from the backend directory, with the same environment as the server):
+    python migrate_compact_ids.py [--dry-run] [--reverse] [--batch-size 500]
+
+Stop the API (or every writer) first, migrate, then restart it with
+COMPACT_STORAGE=true (false after --reverse). Documents with an ``id`` are
+re-keyed: each batch is upserted under its new key before the old documents
+are deleted, so an interrupted run can simply be started again. Documents
+without one (waveforms) keep their ``_id`` and only have their reference
+fields converted in place. Unique indexes on ``id`` are dropped when going
+compact since ``_id`` takes over that role.
+"""
+import argparse
+import sys
+
+from bson import ObjectId
+from pymongo import MongoClient, ReplaceOne, UpdateOne
+
+from compact_storage import UUID_FIELDS, decode_document, encode_document
+
+
+def id_indexes(collection):
+    return [name for name, spec in collection.index_information().items() if spec["key"] == [("id", 1)]]
+
+
+def pending_filter(reverse: bool) -> dict:
+    """Documents still in the other format"""
+    if reverse:
+        # Compact documents are keyed by their id; id-less ones only hold binary references
+        rekeyed = {"id": {"$exists": False}, "_id": {"$not": {"$type": "objectId"}}}
+        return {"$or": [rekeyed] + [{field: {"$type": "binData"}} for field in sorted(UUID_FIELDS)]}
+    return {"$or": [{"id": {"$exists": True}}] + [{field: {"$type": "string"}} for field in sorted(UUID_FIELDS)]}
+
+
+def convert(doc: dict, reverse: bool):
+    """The write that converts ``doc``, and whether its original must be deleted afterwards"""
+    if reverse:
+        if isinstance(doc["_id"], ObjectId):
+            fields = {key: value for key, value in decode_document(doc).items() if key in UUID_FIELDS}
+            return UpdateOne({"_id": doc["_id"]}, {"$set": fields}), False
+        converted = decode_document(doc)
+        return ReplaceOne({"id": converted["id"]}, converted, upsert=True), True
+    if "id" not in doc:
+        fields = {key: value for key, value in encode_document(doc).items() if key in UUID_FIELDS}
+        return UpdateOne({"_id": doc["_id"]}, {"$set": fields}), False
+    converted = encode_document(doc)
+    return ReplaceOne({"_id": converted["_id"]}, converted, upsert=True), True
+
+
+def migrate_collection(collection, reverse: bool, batch_size: int) -> int:
+    if not reverse:
+        for index in id_indexes(collection):
+            collection.drop_index(index)
+
+    migrated = 0
+    operations, originals = [], []
+
+    def flush():
+        collection.bulk_write(operations, ordered=False)
+        if originals:
+            # The converted copies live under new _ids, so only the originals match
+            collection.delete_many({"_id": {"$in": originals}})
+        operations.clear()
+        originals.clear()
+
+    # Re-keyed copies can come up again in the same cursor; converting them is a no-op
+    for doc in collection.find(pending_filter(reverse), batch_size=batch_size):
+        operation, rekeyed = convert(doc, reverse)
+        operations.append(operation)
+        if rekeyed:
+            originals.append(doc["_id"])
+        migrated += 1
+        if len(operations) >= batch_size:
+            flush()
+    if operations:
+        flush()
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reverse", action="store_true", help="convert compact documents back to string ids")
+    parser.add_argument("--dry-run", action="store_true", help="only count documents that would be converted")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    # Same database and collection list as the server
+    from server import COMPACT_COLLECTIONS, DB_NAME, mongo_url
+
+    database = MongoClient(mongo_url)[DB_NAME]
+    for name in COMPACT_COLLECTIONS:
+        collection = database[name]
+        if args.dry_run:
+            count = collection.count_documents(pending_filter(args.reverse))
+            print(f"{name:24} {count:>8} to convert")
+            continue
+        print(f"{name:24} {migrate_collection(collection, args.reverse, args.batch_size):>8} converted")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""Token-bucket rate limiting and in-flight admission control."""
+import asyncio
+import json
+import logging
+import math
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitRule:
+    """Allow ``limit`` requests per ``period`` seconds, with bursts up to ``burst``."""
+
+    def __init__(self, method: str, path: str, limit: int, period: float, burst: Optional[int] = None):
+        self.method = method.upper()
+        self.path = path
+        self.limit = limit
+        self.period = period
+        self.burst = burst or limit
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.period
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.method != '*' and self.method != method:
+            return False
+        if self.path.endswith('*'):
+            return path.startswith(self.path[:-1])
+        return path == self.path
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+
+def parse_rules(spec: str) -> List[RateLimitRule]:
+    """Parse ``"POST /api/auth/login=5/60:10; * /api/*=20/1"`` into rules.
+
+    Each entry is ``METHOD PATH=LIMIT/PERIOD[:BURST]``; a trailing ``*`` on the
+    path matches any suffix. Entries are tried in order, first match wins.
+    """
+    rules = []
+    for entry in spec.split(';'):
+        entry = entry.strip()
+        if not entry:
+            continue
+        target, _, budget = entry.rpartition('=')
+        method, _, path = target.strip().partition(' ')
+        amount, _, burst = budget.partition(':')
+        limit, _, period = amount.partition('/')
+        rules.append(RateLimitRule(
+            method=method,
+            path=path.strip(),
+            limit=int(limit),
+            period=float(period or 1),
+            burst=int(burst) if burst else None,
+        ))
+    return rules
+
+
+# ==================== BACKENDS ====================
+
+class MemoryRateLimitBackend:
+    """Buckets kept in this process; fine for a single worker."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated, time at which the bucket is full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    async def take(self, key: str, rate: float, capacity: int, cost: int = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        if len(self._buckets) > self.max_keys:
+            self._evict(now)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def _evict(self, now: float):
+        # A bucket that has refilled completely carries no state worth keeping
+        for key, (_, _, full_at) in list(self._buckets.items()):
+            if full_at <= now:
+                del self._buckets[key]
+        while len(self._buckets) > self.max_keys:
+            self._buckets.pop(next(iter(self._buckets)))
+
+
+class MongoRateLimitBackend:
+    """Buckets shared by every worker and instance through a Mongo collection.
+
+    Each take is a single atomic ``find_one_and_update`` with an aggregation
+    pipeline, so concurrent workers never double-spend a token. A TTL index
+    removes buckets once they have been idle long enough to be full again.
+    If Mongo is unreachable requests are let through rather than failed.
+    """
+
+    def __init__(self, get_collection: Callable[[], Any]):
+        # Resolved per call because the Mongo client is created in the app lifespan
+        self.get_collection = get_collection
+        self._indexed = False
+
+    async def take(self, key: str, rate: float, capacity: int, cost: int = 1) -> Tuple[bool, float]:
+        try:
+            return await self._take(key, rate, capacity, cost)
+        except PyMongoError as e:
+            logger.warning("Rate limit check for %s skipped: %s", key, e)
+            return True, 0.0
+
+    async def _take(self, key: str, rate: float, capacity: int, cost: int) -> Tuple[bool, float]:
+        collection = self.get_collection()
+        if not self._indexed:
+            await collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+
+        now = time.time()
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=capacity / rate)
+        refilled = {"$min": [
+            capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", capacity]},
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rate]},
+            ]},
+        ]}
+        doc = await collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated": now, "expires_at": expires_at}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["allowed"]:
+            return True, 0.0
+        return False, (cost - doc["tokens"]) / rate
+
+
+# ==================== MIDDLEWARE ====================
+
+async def send_json_error(send, status_code: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Apply the first matching rule, keyed on user id or client IP.
+
+    Rules named in ``shared_rules`` keep their buckets in ``shared_backend``;
+    the rest use ``backend``, so cheap catch-all limits need no database write.
+
+    Behind ``proxy_hops`` trusted reverse proxies the client IP is the
+    X-Forwarded-For entry that many places from the right, the one the
+    outermost trusted proxy appended. Entries further left are set by the
+    client and never used, so rotating them cannot buy fresh buckets.
+    """
+
+    def __init__(
+        self,
+        app,
+        backend,
+        rules: Iterable[RateLimitRule],
+        user_id_resolver: Callable[[str], Optional[str]],
+        shared_backend=None,
+        shared_rules: Iterable[str] = (),
+        proxy_hops: int = 0,
+    ):
+        self.app = app
+        self.backend = backend
+        self.rules = list(rules)
+        self.user_id_resolver = user_id_resolver
+        self.shared_backend = shared_backend
+        self.shared_rules = {name.strip() for name in shared_rules}
+        self.proxy_hops = proxy_hops
+
+    def rule_for(self, method: str, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    def backend_for(self, rule: RateLimitRule):
+        if self.shared_backend is not None and rule.name in self.shared_rules:
+            return self.shared_backend
+        return self.backend
+
+    def client_ip(self, headers: Headers, scope) -> str:
+        if self.proxy_hops > 0:
+            hops = [hop.strip() for value in headers.getlist("x-forwarded-for") for hop in value.split(',')]
+            if len(hops) >= self.proxy_hops:
+                return hops[-self.proxy_hops]
+        client = scope.get("client")
+        return client[0] if client else 'unknown'
+
+    def client_key(self, scope) -> str:
+        headers = Headers(scope=scope)
+        user_id = self.user_id_resolver(headers.get("authorization", ""))
+        if user_id:
+            return f"user:{user_id}"
+        return f"ip:{self.client_ip(headers, scope)}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.rule_for(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = f"{rule.name}|{self.client_key(scope)}"
+        allowed, retry_after = await self.backend_for(rule).take(key, rule.rate, rule.burst)
+        if not allowed:
+            await send_json_error(send, 429, "Too many requests", retry_after)
+            return
+        await self.app(scope, receive, send)
+
+
+class AdmissionControlMiddleware:
+    """Cap the number of requests being processed at once.
+
+    Requests over the cap wait up to ``queue_timeout`` seconds for a slot and
+    are then shed with 503, so latency stays bounded under overload instead of
+    every request slowing down together.
+    """
+
+    def __init__(self, app, max_in_flight: int, queue_timeout: float = 0.0, exempt_paths: Iterable[str] = ()):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.exempt_paths = tuple(exempt_paths)
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        if self._semaphore.locked() and self.queue_timeout <= 0:
+            await send_json_error(send, 503, "Server busy, please retry", 1)
+            return
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            await send_json_error(send, 503, "Server busy, please retry", 1)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
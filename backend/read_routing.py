@@ -0,0 +1,207 @@
+"""Route latency-tolerant reads to secondaries without changing handlers."""
+import asyncio
+import contextvars
+import fnmatch
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import PyMongoError
+from pymongo.read_preferences import SecondaryPreferred
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+# Set per request by ReadRoutingMiddleware; everything defaults to the primary
+_use_secondary: contextvars.ContextVar[bool] = contextvars.ContextVar("use_secondary", default=False)
+# Shared pin writes started by the current request, awaited before it responds
+_pending_pins: contextvars.ContextVar[Optional[List[asyncio.Task]]] = contextvars.ContextVar("pending_pins", default=None)
+
+READ_METHODS = frozenset({"find", "find_one", "count_documents", "estimated_document_count", "aggregate", "distinct"})
+
+# MongoDB rejects smaller values: staleness is only measured every heartbeat
+MIN_MAX_STALENESS_SECONDS = 90
+
+
+class MongoPinStore:
+    """Primary pins shared by every worker and instance through a Mongo collection.
+
+    One document per user holds the time its pin expires; a TTL index removes
+    it afterwards. Lookups must read from the primary.
+    """
+
+    def __init__(self, get_collection: Callable[[], Any]):
+        # Resolved per call because the Mongo client is created in the app lifespan
+        self.get_collection = get_collection
+        self._indexed = False
+
+    async def pin(self, user_id: str, seconds: float):
+        collection = self.get_collection()
+        if not self._indexed:
+            await collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=seconds)
+        await collection.update_one({"_id": user_id}, {"$max": {"expires_at": expires_at}}, upsert=True)
+
+    async def pinned(self, user_id: str) -> bool:
+        pin = await self.get_collection().find_one(
+            {"_id": user_id, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 1}
+        )
+        return pin is not None
+
+
+class ReadRouter:
+    """Decide per request whether reads may be served by a secondary.
+
+    A request qualifies when its route is listed as latency tolerant and its
+    user has not written within ``pin_seconds``. Writes pin the user to the
+    primary for that window, which keeps reads after writes consistent
+    without threading causal sessions through every handler.
+
+    Pins are kept in this process and, with a ``store``, also where other
+    workers see them: the write's response waits for the shared pin, and a
+    read not pinned locally checks the store (one primary lookup by _id).
+    """
+
+    def __init__(
+        self,
+        routes: Iterable[str],
+        max_staleness_seconds: int,
+        pin_seconds: Optional[float] = None,
+        store: Optional[MongoPinStore] = None,
+    ):
+        if max_staleness_seconds != -1 and max_staleness_seconds < MIN_MAX_STALENESS_SECONDS:
+            raise ValueError(f"maxStalenessSeconds must be -1 or at least {MIN_MAX_STALENESS_SECONDS}")
+        self.routes = [route.split(' ', 1) for route in routes]
+        self.read_preference = SecondaryPreferred(max_staleness=max_staleness_seconds)
+        self.pin_seconds = pin_seconds if pin_seconds is not None else max(max_staleness_seconds, 0)
+        self.store = store
+        self._last_write: Dict[str, float] = {}
+
+    def note_write(self, user_id: str):
+        now = time.monotonic()
+        self._last_write[user_id] = now
+        if len(self._last_write) > 10_000:
+            cutoff = now - self.pin_seconds
+            self._last_write = {user: at for user, at in self._last_write.items() if at > cutoff}
+        if self.store is not None:
+            task = asyncio.create_task(self._share_pin(user_id))
+            pending = _pending_pins.get()
+            if pending is not None:
+                pending.append(task)
+
+    async def _share_pin(self, user_id: str):
+        try:
+            await self.store.pin(user_id, self.pin_seconds)
+        except PyMongoError as e:
+            logger.warning("Could not share primary pin for %s: %s", user_id, e)
+
+    def pinned_locally(self, user_id: Optional[str]) -> bool:
+        if user_id is None:
+            return False
+        last_write = self._last_write.get(user_id)
+        return last_write is not None and time.monotonic() - last_write < self.pin_seconds
+
+    async def pinned_to_primary(self, user_id: Optional[str]) -> bool:
+        if self.pinned_locally(user_id):
+            return True
+        if user_id is None or self.store is None:
+            return False
+        try:
+            return await self.store.pinned(user_id)
+        except PyMongoError as e:
+            logger.warning("Could not check primary pin for %s: %s", user_id, e)
+            return True
+
+    def route_tolerates_staleness(self, method: str, path: str) -> bool:
+        return any(
+            (route_method == '*' or route_method == method) and fnmatch.fnmatchcase(path, pattern)
+            for route_method, pattern in self.routes
+        )
+
+
+class ReadRoutingMiddleware:
+    def __init__(self, app, router: ReadRouter, user_id_resolver: Callable[[str], Optional[str]]):
+        self.app = app
+        self.router = router
+        self.user_id_resolver = user_id_resolver
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not self.router.route_tolerates_staleness(scope["method"], scope["path"]):
+            if self.router.store is None or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+                await self.app(scope, receive, send)
+            else:
+                await self.call_writing(scope, receive, send)
+            return
+        user_id = self.user_id_resolver(Headers(scope=scope).get("authorization", ""))
+        token = _use_secondary.set(not await self.router.pinned_to_primary(user_id))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _use_secondary.reset(token)
+
+    async def call_writing(self, scope, receive, send):
+        """Hold the response until pins shared by this request's writes are stored"""
+        pending: List[asyncio.Task] = []
+        token = _pending_pins.set(pending)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and pending:
+                await asyncio.gather(*pending)
+                pending.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _pending_pins.reset(token)
+
+
+class RoutedCollection:
+    """Collection proxy sending read methods to a secondary when the request allows it"""
+
+    def __init__(self, collection: AsyncIOMotorCollection, secondary: AsyncIOMotorCollection):
+        self._collection = collection
+        self._secondary = secondary
+
+    def __getattr__(self, name):
+        if name in READ_METHODS and _use_secondary.get():
+            return getattr(self._secondary, name)
+        return getattr(self._collection, name)
+
+
+class RoutedDatabase:
+    """Database proxy handing out RoutedCollections.
+
+    Collections in ``primary_collections`` (users, for authentication and
+    ownership checks) always read from the primary.
+    """
+
+    def __init__(self, database, router: ReadRouter, primary_collections: Iterable[str] = ("users",)):
+        self._database = database
+        self._router = router
+        self._primary_collections = frozenset(primary_collections)
+        self._collections: Dict[str, RoutedCollection] = {}
+
+    def _route(self, name: str, collection):
+        if name in self._primary_collections:
+            return collection
+        routed = self._collections.get(name)
+        if routed is None:
+            secondary = collection.with_options(read_preference=self._router.read_preference)
+            routed = self._collections[name] = RoutedCollection(collection, secondary)
+        return routed
+
+    def __getattr__(self, name):
+        attribute = getattr(self._database, name)
+        if isinstance(attribute, AsyncIOMotorCollection):
+            return self._route(name, attribute)
+        return attribute
+
+    def __getitem__(self, name):
+        return self._route(name, self._database[name])
@@ -0,0 +1,226 @@
+"""iTunes-compatible RSS rendering with per-show and per-episode caching."""
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+# Fields render_item reads; an item is re-rendered only when one of them changes
+ITEM_FIELDS = (
+    "title", "description", "published_at", "duration_minutes", "duration_seconds", "episode_number",
+    "audio_url", "video_url", "thumbnail_url", "file_size_bytes", "mime_type",
+)
+
+ITUNES_NS = "http://www.itunes.com/dtds/podcast-1.0.dtd"
+ATOM_NS = "http://www.w3.org/2005/Atom"
+
+
+def as_datetime(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def absolute_url(url: Optional[str], base_url: str) -> Optional[str]:
+    if url and url.startswith('/'):
+        return base_url.rstrip('/') + url
+    return url
+
+
+def text_element(tag: str, value, **attrs) -> str:
+    attributes = "".join(f" {name.replace('_', ':', 1)}={quoteattr(str(v))}" for name, v in attrs.items())
+    if value is None:
+        return f"<{tag}{attributes}/>"
+    return f"<{tag}{attributes}>{escape(str(value))}</{tag}>"
+
+
+def render_item(episode: dict, base_url: str) -> str:
+    parts = [
+        text_element("title", episode["title"]),
+        text_element("description", episode["description"]),
+        text_element("itunes:summary", episode["description"]),
+        text_element("guid", episode["id"], isPermaLink="false"),
+        text_element("pubDate", format_datetime(as_datetime(episode["published_at"]))),
+        text_element("itunes:duration", int(episode.get("duration_seconds") or episode["duration_minutes"] * 60)),
+        text_element("itunes:episode", episode["episode_number"]),
+        text_element("itunes:episodeType", "full"),
+    ]
+    audio_url = absolute_url(episode.get("audio_url"), base_url)
+    if audio_url:
+        parts.append(text_element(
+            "enclosure", None, url=audio_url,
+            length=episode.get("file_size_bytes") or 0, type=episode.get("mime_type") or "audio/mpeg",
+        ))
+    if episode.get("video_url"):
+        parts.append(text_element("link", absolute_url(episode["video_url"], base_url)))
+    if episode.get("thumbnail_url"):
+        parts.append(text_element("itunes:image", None, href=absolute_url(episode["thumbnail_url"], base_url)))
+    return "<item>" + "".join(parts) + "</item>"
+
+
+def render_channel_head(show: dict, host: Optional[dict], feed_url: str, site_url: str, base_url: str) -> str:
+    parts = [
+        text_element("title", show["title"]),
+        text_element("link", site_url),
+        text_element("description", show["description"]),
+        text_element("itunes:summary", show["description"]),
+        text_element("language", "en"),
+        text_element("atom:link", None, href=feed_url, rel="self", type="application/rss+xml"),
+        text_element("itunes:category", None, text=show["category"]),
+        text_element("itunes:explicit", "false"),
+        text_element("itunes:type", "episodic"),
+    ]
+    if host:
+        parts.append(text_element("itunes:author", host["name"]))
+        parts.append(
+            "<itunes:owner>" + text_element("itunes:name", host["name"])
+            + text_element("itunes:email", host["email"]) + "</itunes:owner>"
+        )
+    if show.get("cover_image_url"):
+        cover = absolute_url(show["cover_image_url"], base_url)
+        parts.append(text_element("itunes:image", None, href=cover))
+        parts.append("<image>" + text_element("url", cover) + text_element("title", show["title"])
+                     + text_element("link", site_url) + "</image>")
+    return "".join(parts)
+
+
+class CachedFeed:
+    __slots__ = ("body", "etag", "last_modified", "built_at", "user_id", "host_id", "episode_ids")
+
+    def __init__(self, body: bytes, etag: str, last_modified: datetime, user_id: str, host_id: str,
+                 episode_ids: List[str]):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.built_at = time.monotonic()
+        self.user_id = user_id
+        self.host_id = host_id
+        self.episode_ids = episode_ids
+
+
+class FeedCache:
+    """Pre-rendered feeds per show, invalidated by change events.
+
+    Rendered ``<item>`` fragments are kept per episode along with the fields
+    they were rendered from, so rebuilding a feed after one episode changes
+    only renders that episode again. ``ttl`` bounds staleness for changes made
+    by other processes that this one never hears about.
+
+    Feeds and fragments embed absolute URLs, so they are cached per
+    ``base_url`` and ``feed_url`` as well: a request with another Host header
+    gets its own copy (at most ``max_variants`` per show) instead of being
+    served, or poisoning, someone else's.
+    """
+
+    def __init__(self, loader: Callable[[str], Awaitable[Optional[Tuple[dict, Optional[dict], List[dict]]]]],
+                 ttl: float = 300.0, max_feeds: int = 1000, max_variants: int = 4):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_feeds = max_feeds
+        self.max_variants = max_variants
+        # show id -> (base_url, feed_url) -> feed
+        self._feeds: Dict[str, Dict[Tuple[str, str], CachedFeed]] = {}
+        # episode id -> base_url -> (signature, fragment)
+        self._items: Dict[str, Dict[str, Tuple[tuple, str]]] = {}
+        self._episode_shows: Dict[str, str] = {}
+
+    async def get(self, show_id: str, feed_url: str, site_url: str, base_url: str) -> Optional[CachedFeed]:
+        variant = (base_url, feed_url)
+        variants = self._feeds.get(show_id, {})
+        cached = variants.get(variant)
+        if cached is not None and time.monotonic() - cached.built_at < self.ttl:
+            return cached
+
+        loaded = await self.loader(show_id)
+        if loaded is None:
+            self.invalidate_show(show_id)
+            return None
+        show, host, episodes = loaded
+
+        items = []
+        for episode in episodes:
+            signature = tuple(str(episode.get(field)) for field in ITEM_FIELDS)
+            renders = self._items.setdefault(episode["id"], {})
+            cached_item = renders.get(base_url)
+            if cached_item is None or cached_item[0] != signature:
+                cached_item = renders[base_url] = (signature, render_item(episode, base_url))
+            self._episode_shows[episode["id"]] = show_id
+            items.append(cached_item[1])
+
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f'<rss version="2.0" xmlns:itunes="{ITUNES_NS}" xmlns:atom="{ATOM_NS}"><channel>'
+            + render_channel_head(show, host, feed_url, site_url, base_url)
+            + "".join(items)
+            + "</channel></rss>"
+        ).encode("utf-8")
+        # Weak, since CompressionMiddleware may re-encode the same representation
+        etag = 'W/"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+        if cached is not None and cached.etag == etag:
+            # Rebuilt after the TTL but nothing changed: keep validators stable
+            cached.built_at = time.monotonic()
+            return cached
+
+        last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        feed = CachedFeed(body, etag, last_modified, show["user_id"], show["host_id"], [e["id"] for e in episodes])
+        if cached is not None:
+            for episode_id in set(cached.episode_ids) - set(feed.episode_ids):
+                self._forget_episode(episode_id)
+        variants = self._feeds.setdefault(show_id, {})
+        variants.pop(variant, None)
+        variants[variant] = feed
+        if len(variants) > self.max_variants:
+            variants.pop(next(iter(variants)))
+        while sum(len(variants) for variants in self._feeds.values()) > self.max_feeds:
+            evicted_id = next(iter(self._feeds))
+            for evicted in self._feeds.pop(evicted_id).values():
+                for episode_id in evicted.episode_ids:
+                    self._forget_episode(episode_id)
+        return feed
+
+    def _forget_episode(self, episode_id: str):
+        self._items.pop(episode_id, None)
+        self._episode_shows.pop(episode_id, None)
+
+    def invalidate_show(self, show_id: str):
+        self._feeds.pop(show_id, None)
+
+    def _shows_where(self, predicate: Callable[[CachedFeed], bool]) -> List[str]:
+        return [show_id for show_id, variants in self._feeds.items() if any(map(predicate, variants.values()))]
+
+    def invalidate_user(self, user_id: str):
+        for show_id in self._shows_where(lambda feed: feed.user_id == user_id):
+            self.invalidate_show(show_id)
+
+    def apply(self, user_id: str, event: dict):
+        """Change feed listener: drop the feeds and items an event touches"""
+        collection = event.get("collection")
+        if collection not in ("episodes", "shows", "hosts"):
+            return
+        if event.get("op") == "reset":
+            for show_id in self._shows_where(lambda feed: feed.user_id == user_id):
+                for feed in self._feeds[show_id].values():
+                    for episode_id in feed.episode_ids:
+                        self._forget_episode(episode_id)
+                self.invalidate_show(show_id)
+            return
+        doc_id = event.get("doc_id")
+        data = event.get("data") or {}
+        if collection == "episodes":
+            previous_show = self._episode_shows.get(doc_id)
+            self._forget_episode(doc_id)
+            if previous_show is None and "show_id" not in data:
+                # e.g. a draft being published via a partial change stream update
+                self.invalidate_user(user_id)
+            for show_id in (previous_show, data.get("show_id")):
+                if show_id:
+                    self.invalidate_show(show_id)
+        elif collection == "shows":
+            self.invalidate_show(doc_id)
+        else:
+            for show_id in self._shows_where(lambda feed: feed.host_id == doc_id):
+                self.invalidate_show(show_id)
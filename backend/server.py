@@ -1,22 +1,46 @@
+import time
+STARTUP_BEGAN = time.perf_counter()
+
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, status, File, UploadFile
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.exceptions import ExceptionMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.responses import FileResponse, Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from authlib.integrations.starlette_client import OAuth
+from contextlib import asynccontextmanager
 import os
+import asyncio
 import logging
-import aiofiles
 import shutil
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
+from functools import lru_cache
 import uuid
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
+from email.utils import format_datetime, parsedate_to_datetime
 from jose import JWTError, jwt
+from http_cache import (
+    CompressionMiddleware, ConditionalGetMiddleware, CollectionVersions, MongoVersionStore, etag_matches
+)
+from write_buffer import WriteBehindBuffer
+from change_feed import ChangeBroker, MongoChangeSource, event_stream
+from ad_placement import AdPlacementEngine, SlotPricing
+from read_routing import MongoPinStore, ReadRouter, ReadRoutingMiddleware, RoutedDatabase
+from rss_feed import FeedCache
+from media_probe import MediaProbeWorker
+from archival import ArchiveTier, Archiver, cold_name, merge_tiers
+from image_proxy import ImageCache, ImageProxyError
+from batch import run_batch
+from compact_storage import CompactDatabase
+from rate_limit import (
+    AdmissionControlMiddleware, MemoryRateLimitBackend, MongoRateLimitBackend, RateLimitMiddleware, parse_rules
+)
+
+IMPORTS_DONE = time.perf_counter()
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -24,24 +48,197 @@ load_dotenv(ROOT_DIR / '.env')
 # MongoDB connection
 # Use MONGO_ATLAS_URL if available, otherwise fall back to local MONGO_URL
 mongo_url = os.environ.get('MONGO_ATLAS_URL') or os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'podcast_network')]
+DB_NAME = os.environ.get('DB_NAME', 'podcast_network')
+
+# Pool settings apply per worker process
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_WARM_CONNECTIONS = int(os.environ.get('MONGO_WARM_CONNECTIONS', str(MONGO_MIN_POOL_SIZE)))
+
+# Read preference routing (replica sets): listed GET routes may read from
+# secondaries; users who wrote recently stay on the primary
+DEFAULT_READ_SECONDARY_ROUTES = (
+    "GET /api/hosts;GET /api/shows;GET /api/episodes;GET /api/advertisers;"
+    "GET /api/*/popular/list;GET /api/ad-placements"
+)
+READ_ROUTING_ENABLED = os.environ.get('READ_ROUTING_ENABLED', 'false').lower() == 'true'
+READ_SECONDARY_ROUTES = [r.strip() for r in os.environ.get('READ_SECONDARY_ROUTES', DEFAULT_READ_SECONDARY_ROUTES).split(';') if r.strip()]
+READ_MAX_STALENESS_SECONDS = int(os.environ.get('READ_MAX_STALENESS_SECONDS', '90'))
+READ_PRIMARY_PIN_SECONDS = float(os.environ.get('READ_PRIMARY_PIN_SECONDS', str(max(READ_MAX_STALENESS_SECONDS, 0))))
+# memory: pins seen by the writing worker only; mongo: shared by all workers
+READ_PIN_STORE = os.environ.get('READ_PIN_STORE', 'memory')
+
+read_router = None
+if READ_ROUTING_ENABLED:
+    read_router = ReadRouter(
+        READ_SECONDARY_ROUTES,
+        READ_MAX_STALENESS_SECONDS,
+        READ_PRIMARY_PIN_SECONDS,
+        store=MongoPinStore(lambda: db.read_pins) if READ_PIN_STORE == 'mongo' else None,
+    )
+
+# Created per worker in the app lifespan
+client = None
+db = None
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 10080  # 7 days
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Response compression and conditional GET
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_ENCODINGS = [e.strip() for e in os.environ.get('COMPRESSION_ENCODINGS', 'br,gzip').split(',') if e.strip()]
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
+CONDITIONAL_GET_ENABLED = os.environ.get('CONDITIONAL_GET_ENABLED', 'true').lower() == 'true'
+VERSIONED_COLLECTIONS = ("hosts", "shows", "episodes", "advertisers")
+# memory keeps versions per process; mongo shares them so several workers agree on ETags
+CONDITIONAL_GET_STORE = os.environ.get('CONDITIONAL_GET_STORE', 'memory')
+
+collection_versions = CollectionVersions(
+    store=MongoVersionStore(lambda: db.collection_versions) if CONDITIONAL_GET_STORE == 'mongo' else None,
+)
+
+# Rate limiting and admission control
+# Rules are "METHOD PATH=LIMIT/PERIOD[:BURST]", first match wins
+DEFAULT_RATE_LIMIT_RULES = (
+    "POST /api/auth/login=10/60:5;"
+    "POST /api/auth/register=5/60;"
+    "POST /api/initialize-defaults=3/60:1;"
+    "DELETE /api/clear-all-data=3/60:1;"
+    "POST /api/upload/*=20/60;"
+    # Public and able to fill the image cache with arbitrary URLs
+    "GET /api/img-proxy=5/1:100;"
+    "* /api/*=20/1:60"
+)
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # memory or mongo
+RATE_LIMIT_RULES = parse_rules(os.environ.get('RATE_LIMIT_RULES', DEFAULT_RATE_LIMIT_RULES))
+# With the mongo backend only these rules share buckets across workers; the
+# rest (notably the catch-all) stay in memory so reads cost no Mongo write
+RATE_LIMIT_SHARED_RULES = os.environ.get(
+    'RATE_LIMIT_SHARED_RULES',
+    'POST /api/auth/login,POST /api/auth/register,POST /api/initialize-defaults,'
+    'DELETE /api/clear-all-data,POST /api/upload/*',
+).split(',')
+# Reverse proxies in front of the API that append to X-Forwarded-For (1 on Render)
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0'))
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', '64'))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '0.5'))
+
+# Write-behind batching of show/episode updates. Buffered changes live in the
+# worker that accepted them, so read-your-writes only holds for reads served
+# by that worker: with several workers a GET landing on another one can return
+# the pre-edit document for up to the window. Enable it with a single worker.
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+WRITE_BEHIND_WINDOW_MS = int(os.environ.get('WRITE_BEHIND_WINDOW_MS', '250'))
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', '500'))
+
+write_buffers = {}
+if WRITE_BEHIND_ENABLED:
+    for collection_name in ("shows", "episodes"):
+        write_buffers[collection_name] = WriteBehindBuffer(
+            # Bind the name now; db itself is only created in the lifespan
+            lambda name=collection_name: db[name],
+            window=WRITE_BEHIND_WINDOW_MS / 1000,
+            max_pending=WRITE_BEHIND_MAX_PENDING,
+        )
+
+# Live change feed (Server-Sent Events)
+# local: events published by this process on writes (single worker only, gunicorn.conf.py
+# switches to mongo when it runs several); mongo: change streams (replica set)
+CHANGE_FEED_SOURCE = os.environ.get('CHANGE_FEED_SOURCE', 'local')
+CHANGE_FEED_HISTORY = int(os.environ.get('CHANGE_FEED_HISTORY', '200'))
+CHANGE_FEED_QUEUE_SIZE = int(os.environ.get('CHANGE_FEED_QUEUE_SIZE', '100'))
+CHANGE_FEED_HEARTBEAT = float(os.environ.get('CHANGE_FEED_HEARTBEAT', '15'))
+CHANGE_FEED_MAX_CONNECTIONS = int(os.environ.get('CHANGE_FEED_MAX_CONNECTIONS', '500'))
+CHANGE_FEED_HISTORY_TTL = float(os.environ.get('CHANGE_FEED_HISTORY_TTL', '3600'))
+CHANGE_FEED_HISTORY_USERS = int(os.environ.get('CHANGE_FEED_HISTORY_USERS', '10000'))
+# Lifetime of the single-purpose ticket EventSource clients pass as ?ticket=
+CHANGE_FEED_TICKET_SECONDS = int(os.environ.get('CHANGE_FEED_TICKET_SECONDS', '60'))
+
+change_broker = ChangeBroker(
+    history_size=CHANGE_FEED_HISTORY,
+    max_queue=CHANGE_FEED_QUEUE_SIZE,
+    history_ttl=CHANGE_FEED_HISTORY_TTL,
+    max_users=CHANGE_FEED_HISTORY_USERS,
+)
+change_source = None
+if CHANGE_FEED_SOURCE == 'mongo':
+    change_source = MongoChangeSource(lambda: db, change_broker, VERSIONED_COLLECTIONS)
+
+# Ad placement engine
+AD_PRICE_PRE_ROLL = float(os.environ.get('AD_PRICE_PRE_ROLL', '400'))
+AD_PRICE_MID_ROLL = float(os.environ.get('AD_PRICE_MID_ROLL', '600'))
+AD_PRICE_POST_ROLL = float(os.environ.get('AD_PRICE_POST_ROLL', '250'))
+AD_MID_ROLL_EVERY_MINUTES = int(os.environ.get('AD_MID_ROLL_EVERY_MINUTES', '15'))
+AD_MAX_MID_ROLLS = int(os.environ.get('AD_MAX_MID_ROLLS', '3'))
+AD_PLACEMENT_CACHED_USERS = int(os.environ.get('AD_PLACEMENT_CACHED_USERS', '100'))
+AD_PLACEMENT_TTL_SECONDS = float(os.environ.get('AD_PLACEMENT_TTL_SECONDS', '300'))
+
+# Public podcast RSS feeds
+# Base for absolute enclosure/image URLs of uploaded files; defaults to the request's host
+PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', '')
+FEED_CACHE_TTL_SECONDS = float(os.environ.get('FEED_CACHE_TTL_SECONDS', '300'))
+FEED_CACHED_SHOWS = int(os.environ.get('FEED_CACHED_SHOWS', '1000'))
+
+# Background probing of locally stored episode media
+MEDIA_PROBE_ENABLED = os.environ.get('MEDIA_PROBE_ENABLED', 'true').lower() == 'true'
+MEDIA_PROBE_CONCURRENCY = int(os.environ.get('MEDIA_PROBE_CONCURRENCY', '2'))
+MEDIA_WAVEFORM_BUCKETS = int(os.environ.get('MEDIA_WAVEFORM_BUCKETS', '800'))
+MEDIA_MAX_UPLOAD_MB = int(os.environ.get('MEDIA_MAX_UPLOAD_MB', '500'))
+
+# Hot/cold tiering of archived episodes, completed shows and inactive advertisers
+ARCHIVE_ENABLED = os.environ.get('ARCHIVE_ENABLED', 'true').lower() == 'true'
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', '30'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_INTERVAL_MINUTES = float(os.environ.get('ARCHIVE_INTERVAL_MINUTES', '60'))
+
+# Caching proxy for remote host/show images
+IMG_PROXY_CACHE_DIR = Path(os.environ.get('IMG_PROXY_CACHE_DIR', 'cache/images'))
+IMG_PROXY_CACHE_MB = int(os.environ.get('IMG_PROXY_CACHE_MB', '256'))
+IMG_PROXY_FRESH_HOURS = float(os.environ.get('IMG_PROXY_FRESH_HOURS', '24'))
+IMG_PROXY_MAX_IMAGE_MB = int(os.environ.get('IMG_PROXY_MAX_IMAGE_MB', '10'))
+IMG_PROXY_TIMEOUT = float(os.environ.get('IMG_PROXY_TIMEOUT', '10'))
+# Empty allows any public host; private/loopback origins are only for local testing
+IMG_PROXY_ALLOWED_HOSTS = [h.strip() for h in os.environ.get('IMG_PROXY_ALLOWED_HOSTS', '').split(',') if h.strip()]
+IMG_PROXY_ALLOW_PRIVATE = os.environ.get('IMG_PROXY_ALLOW_PRIVATE', 'false').lower() == 'true'
+IMG_PROXY_MAX_AGE = int(os.environ.get('IMG_PROXY_MAX_AGE', '604800'))
+
+# Batched reads
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '20'))
+
+ARCHIVE_TIERS = (
+    ArchiveTier("episodes", "archived", age_field="published_at"),
+    ArchiveTier("shows", "completed"),
+    ArchiveTier("advertisers", "inactive"),
+)
+
+# Opt-in compact storage: ids as binary UUID _ids (see migrate_compact_ids.py)
+COMPACT_STORAGE = os.environ.get('COMPACT_STORAGE', 'false').lower() == 'true'
+COMPACT_COLLECTIONS = (
+    "users", "hosts", "shows", "episodes", "advertisers", "waveforms",
+    *(cold_name(tier.collection) for tier in ARCHIVE_TIERS),
+)
 
 # OAuth Setup
-oauth = OAuth()
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID', '')
 GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET', '')
 GOOGLE_REDIRECT_URI = os.environ.get('GOOGLE_REDIRECT_URI', 'http://localhost:8000/api/auth/google/callback')
 
-if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET:
+@lru_cache(maxsize=None)
+def get_google_oauth():
+    """Register the Google client on first use; authlib pulls in httpx and is slow to import"""
+    from authlib.integrations.starlette_client import OAuth
+
+    oauth = OAuth()
     oauth.register(
         name='google',
         client_id=GOOGLE_CLIENT_ID,
@@ -52,17 +249,78 @@ if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET:
             'redirect_uri': GOOGLE_REDIRECT_URI
         }
     )
+    return oauth.google
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Startup timings, reported by /api/health and the startup log line
+startup_timings = {"import_ms": round((IMPORTS_DONE - STARTUP_BEGAN) * 1000, 1), "ready_ms": None}
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    )
 
-app = FastAPI()
+async def warm_mongo_pool(count: int):
+    """Open `count` pooled connections up front so first requests skip the handshake"""
+    try:
+        # Concurrent pings each need their own connection
+        await asyncio.gather(*[db.command("ping") for _ in range(max(1, count))])
+        logger.info("MongoDB pool warmed with %d connections", count)
+    except Exception as e:
+        logger.warning("MongoDB pool warm-up failed: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    (UPLOAD_DIR / "hosts").mkdir(parents=True, exist_ok=True)
+    (UPLOAD_DIR / "media").mkdir(parents=True, exist_ok=True)
+    client = create_mongo_client()
+    db = client[DB_NAME]
+    if read_router is not None:
+        db = RoutedDatabase(db, read_router, primary_collections=("users", "read_pins", "collection_versions"))
+    if COMPACT_STORAGE:
+        db = CompactDatabase(db, COMPACT_COLLECTIONS)
+    # Warm in the background so an unreachable Mongo never delays readiness
+    warm_task = asyncio.create_task(warm_mongo_pool(MONGO_WARM_CONNECTIONS))
+    if change_source is not None:
+        change_source.start()
+    if media_probe_worker is not None:
+        media_probe_worker.start()
+    if ARCHIVE_ENABLED:
+        archiver.start()
+    startup_timings["ready_ms"] = round((time.perf_counter() - STARTUP_BEGAN) * 1000, 1)
+    logger.info("Application ready in %.1f ms (imports %.1f ms)", startup_timings["ready_ms"], startup_timings["import_ms"])
+    yield
+    warm_task.cancel()
+    if change_source is not None:
+        await change_source.stop()
+    if media_probe_worker is not None:
+        await media_probe_worker.stop()
+    await archiver.stop()
+    await image_cache.close()
+    for buffer in write_buffers.values():
+        await buffer.close()
+    # The server has already drained in-flight requests at this point
+    client.close()
+    logger.info("MongoDB connections closed")
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
 
-# Create uploads directory
+# Uploads directory, created in the lifespan
 UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-(UPLOAD_DIR / "hosts").mkdir(exist_ok=True)
 
 # Serve uploaded files
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR), check_dir=False), name="uploads")
 
 api_router = APIRouter(prefix="/api")
 
@@ -136,6 +394,12 @@ class Episode(BaseModel):
     published_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     status: str = "draft"  # draft, published, archived
     user_id: str
+    # Filled in by the media probe from the audio/video file
+    duration_seconds: Optional[float] = None
+    bitrate: Optional[int] = None
+    codec: Optional[str] = None
+    file_size_bytes: Optional[int] = None
+    mime_type: Optional[str] = None
 
 class EpisodeCreate(BaseModel):
     show_id: str
@@ -157,6 +421,7 @@ class Advertiser(BaseModel):
     phone: str
     budget: float
     status: str = "active"  # active, inactive
+    target_categories: List[str] = []  # show categories to advertise in, empty for any
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     user_id: str
 
@@ -167,14 +432,25 @@ class AdvertiserCreate(BaseModel):
     phone: str
     budget: float
     status: str = "active"
+    # None leaves an advertiser's targeting untouched on update
+    target_categories: Optional[List[str]] = None
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    etag: Optional[str] = None  # sent as If-None-Match
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
 
 # ==================== AUTH HELPERS ====================
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -183,7 +459,105 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def user_id_from_authorization(authorization: str) -> Optional[str]:
+    """Extract the user id from a bearer token without a database lookup"""
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+def mark_changed(user_id: str, *collections: str):
+    """Invalidate the ETags of the given collections and pin the user's reads to the primary"""
+    collection_versions.bump(user_id, *collections)
+    if read_router is not None:
+        read_router.note_write(user_id)
+
+def record_change(user_id: str, collection: str, op: str, doc_id: str, data: Optional[dict] = None):
+    """Invalidate ETags and publish a create/update/delete event to the change feed"""
+    mark_changed(user_id, collection)
+    if CHANGE_FEED_SOURCE != 'mongo':
+        event = {"id": change_broker.next_id(), "collection": collection, "op": op, "doc_id": doc_id}
+        if data is not None:
+            event["data"] = data
+        change_broker.publish(user_id, event)
+
+def record_bulk_change(user_id: str, *collections: str):
+    """Like record_change for bulk rewrites: clients should refetch these collections"""
+    mark_changed(user_id, *collections)
+    if CHANGE_FEED_SOURCE != 'mongo':
+        for collection in collections:
+            change_broker.publish(user_id, {"id": change_broker.next_id(), "collection": collection, "op": "reset"})
+
+async def update_document(collection: str, doc_id: str, existing: dict, update_data: dict) -> Optional[dict]:
+    """Apply a $set update, through the write-behind buffer when one is enabled.
+
+    Returns None if the document disappeared meanwhile, e.g. moved to cold storage.
+    """
+    buffer = write_buffers.get(collection)
+    if buffer is None:
+        await db[collection].update_one({"id": doc_id}, {"$set": update_data})
+        return await db[collection].find_one({"id": doc_id}, {"_id": 0})
+    await buffer.update(doc_id, update_data)
+    return buffer.overlay(dict(existing))
+
+def with_pending(collection: str, docs: List[dict]) -> List[dict]:
+    """Overlay buffered, not yet written changes on documents read from Mongo"""
+    buffer = write_buffers.get(collection)
+    return buffer.overlay_many(docs) if buffer else docs
+
+def with_pending_one(collection: str, doc: Optional[dict]) -> Optional[dict]:
+    buffer = write_buffers.get(collection)
+    return buffer.overlay(doc) if buffer and doc else doc
+
+async def flush_pending(collection: str):
+    """Write buffered changes before a query that filters or sorts on them"""
+    buffer = write_buffers.get(collection)
+    if buffer:
+        await buffer.barrier()
+
+def stamp_status_change(existing: dict, update_data: dict) -> dict:
+    """Record when the status changed; archival ages documents from that moment"""
+    if 'status' in update_data and update_data['status'] != existing.get('status'):
+        update_data['status_changed_at'] = datetime.now(timezone.utc).isoformat()
+    return update_data
+
+async def find_with_archive(collection: str, query: dict, include_archived: bool, limit: int = 1000) -> List[dict]:
+    """find() on the hot collection, plus its cold counterpart when asked to"""
+    if not include_archived:
+        return await db[collection].find(query, {"_id": 0}).to_list(limit)
+    hot, cold = await asyncio.gather(
+        db[collection].find(query, {"_id": 0}).to_list(limit),
+        db[cold_name(collection)].find(query, {"_id": 0}).to_list(limit),
+    )
+    return merge_tiers(hot, cold)[:limit]
+
+async def find_one_with_archive(collection: str, query: dict, include_archived: bool) -> Optional[dict]:
+    doc = await db[collection].find_one(query, {"_id": 0})
+    if doc is None and include_archived:
+        doc = await db[cold_name(collection)].find_one(query, {"_id": 0})
+    return doc
+
+async def delete_with_archive(collection: str, query: dict) -> int:
+    """Delete from the hot collection, falling back to the cold one"""
+    result = await db[collection].delete_one(query)
+    if result.deleted_count == 0:
+        result = await db[cold_name(collection)].delete_one(query)
+    return result.deleted_count
+
+def discard_pending(collection: str, doc_id: str):
+    buffer = write_buffers.get(collection)
+    if buffer:
+        buffer.discard(doc_id)
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Sub-requests of /api/batch reuse the user the batch authenticated
+    batch_user = getattr(request.state, "batch_user", None)
+    if batch_user is not None:
+        return batch_user
     try:
         token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -197,6 +571,13 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
 
+# ==================== HEALTH ====================
+
+@api_router.get("/health")
+async def health():
+    """Liveness probe, also reports how long this worker took to start"""
+    return {"status": "ok", "startup": startup_timings}
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register")
@@ -236,7 +617,7 @@ async def login(credentials: UserLogin):
 async def google_login(request: Request):
     if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
         raise HTTPException(status_code=400, detail="Google OAuth not configured")
-    return await oauth.google.authorize_redirect(request, GOOGLE_REDIRECT_URI)
+    return await get_google_oauth().authorize_redirect(request, GOOGLE_REDIRECT_URI)
 
 @api_router.get("/auth/google/callback")
 async def google_callback(request: Request):
@@ -246,7 +627,7 @@ async def google_callback(request: Request):
     frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
     
     try:
-        token = await oauth.google.authorize_access_token(request)
+        token = await get_google_oauth().authorize_access_token(request)
         user_info = token.get('userinfo')
         if not user_info:
             # Redirect to frontend with error
@@ -313,6 +694,119 @@ async def upload_host_image(
             file_path.unlink()
         raise HTTPException(status_code=500, detail="Failed to upload image")
 
+@api_router.post("/upload/episode-media")
+async def upload_episode_media(
+    media: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Store an episode's audio or video; it is probed once an episode references it"""
+    if not media.content_type.startswith(("audio/", "video/")):
+        raise HTTPException(status_code=400, detail="File must be audio or video")
+
+    if media.size > MEDIA_MAX_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(status_code=400, detail=f"File size must be less than {MEDIA_MAX_UPLOAD_MB}MB")
+
+    file_extension = media.filename.split('.')[-1] if '.' in media.filename else 'mp3'
+    unique_filename = f"{uuid.uuid4()}.{file_extension}"
+    file_path = UPLOAD_DIR / "media" / unique_filename
+
+    try:
+        # Up to MEDIA_MAX_UPLOAD_MB of disk I/O; keep it off the event loop
+        with open(file_path, "wb") as buffer:
+            await asyncio.to_thread(shutil.copyfileobj, media.file, buffer)
+        return {"url": f"/uploads/media/{unique_filename}"}
+
+    except Exception as e:
+        if file_path.exists():
+            file_path.unlink()
+        raise HTTPException(status_code=500, detail="Failed to upload media")
+
+# ==================== MEDIA PROBING ====================
+
+def local_media_path(url: Optional[str]) -> Optional[Path]:
+    """Path of an uploaded file referenced by an episode URL, or None for external media"""
+    if not url:
+        return None
+    if PUBLIC_BASE_URL and url.startswith(PUBLIC_BASE_URL.rstrip('/') + '/'):
+        url = url[len(PUBLIC_BASE_URL.rstrip('/')):]
+    if not url.startswith('/uploads/'):
+        return None
+    upload_root = UPLOAD_DIR.resolve()
+    path = (upload_root / url[len('/uploads/'):]).resolve()
+    if not path.is_relative_to(upload_root) or not path.is_file():
+        return None
+    return path
+
+async def store_probe_result(episode_id: str, media_url: str, result: dict):
+    probe = result["probe"]
+    fields = {**probe, "duration_minutes": max(1, round(probe["duration_seconds"] / 60)), "media_probed_url": media_url}
+    # The media URL may have changed in an update still held by the write buffer
+    await flush_pending("episodes")
+    # Only apply if the episode still points at the file that was probed
+    episode = await db.episodes.find_one_and_update(
+        {"id": episode_id, "$or": [{"audio_url": media_url}, {"video_url": media_url}]},
+        {"$set": fields},
+        projection={"_id": 0, "user_id": 1},
+    )
+    if episode is None:
+        return
+    if result["peaks"] is not None:
+        await db.waveforms.update_one(
+            {"episode_id": episode_id},
+            {"$set": {"user_id": episode['user_id'], "peaks": result["peaks"], "media_url": media_url}},
+            upsert=True,
+        )
+    record_change(episode['user_id'], "episodes", "update", episode_id, fields)
+
+media_probe_worker = None
+if MEDIA_PROBE_ENABLED:
+    media_probe_worker = MediaProbeWorker(
+        store_probe_result, concurrency=MEDIA_PROBE_CONCURRENCY, buckets=MEDIA_WAVEFORM_BUCKETS
+    )
+
+def queue_media_probe(episode: dict):
+    """Probe the episode's local audio (or else video) file unless it was already probed"""
+    if media_probe_worker is None:
+        return
+    for url in (episode.get('audio_url'), episode.get('video_url')):
+        path = local_media_path(url)
+        if path is not None:
+            if url != episode.get('media_probed_url'):
+                media_probe_worker.submit(episode['id'], url, path)
+            return
+
+# ==================== IMAGE PROXY ====================
+
+image_cache = ImageCache(
+    IMG_PROXY_CACHE_DIR,
+    max_bytes=IMG_PROXY_CACHE_MB * 1024 * 1024,
+    fresh_seconds=IMG_PROXY_FRESH_HOURS * 3600,
+    max_image_bytes=IMG_PROXY_MAX_IMAGE_MB * 1024 * 1024,
+    timeout=IMG_PROXY_TIMEOUT,
+    allowed_hosts=IMG_PROXY_ALLOWED_HOSTS,
+    allow_private=IMG_PROXY_ALLOW_PRIVATE,
+)
+
+@api_router.get("/img-proxy")
+async def proxy_image(url: str, request: Request):
+    """Serve a remote image from the local cache, fetching it on first use"""
+    try:
+        image = await image_cache.get(url)
+    except ImageProxyError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Public: <img> tags cannot send the Authorization header
+    headers = {
+        "ETag": image.etag,
+        "Cache-Control": f"public, max-age={IMG_PROXY_MAX_AGE}, stale-while-revalidate=86400",
+        # Served from the API's origin: never let a response be sniffed or run as a document
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "default-src 'none'; sandbox",
+    }
+    if etag_matches(request.headers.get("if-none-match", ""), image.etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(image.path, media_type=image.content_type, headers=headers)
+
 # ==================== HOST ROUTES ====================
 
 @api_router.post("/hosts", response_model=Host)
@@ -321,6 +815,7 @@ async def create_host(host_data: HostCreate, current_user: dict = Depends(get_cu
     doc = host.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.hosts.insert_one(doc)
+    record_change(current_user['id'], "hosts", "create", host.id, host.model_dump(mode="json"))
     return host
 
 @api_router.get("/hosts", response_model=List[Host])
@@ -348,6 +843,7 @@ async def update_host(host_id: str, host_data: HostCreate, current_user: dict =
     
     update_data = host_data.model_dump()
     await db.hosts.update_one({"id": host_id}, {"$set": update_data})
+    record_change(current_user['id'], "hosts", "update", host_id, update_data)
     updated = await db.hosts.find_one({"id": host_id}, {"_id": 0})
     if isinstance(updated['created_at'], str):
         updated['created_at'] = datetime.fromisoformat(updated['created_at'])
@@ -358,6 +854,7 @@ async def delete_host(host_id: str, current_user: dict = Depends(get_current_use
     result = await db.hosts.delete_one({"id": host_id, "user_id": current_user['id']})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Host not found")
+    record_change(current_user['id'], "hosts", "delete", host_id)
     return {"message": "Host deleted successfully"}
 
 @api_router.get("/hosts/popular/list", response_model=List[Host])
@@ -381,19 +878,20 @@ async def create_show(show_data: ShowCreate, current_user: dict = Depends(get_cu
     doc = show.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.shows.insert_one(doc)
+    record_change(current_user['id'], "shows", "create", show.id, show.model_dump(mode="json"))
     return show
 
 @api_router.get("/shows", response_model=List[Show])
-async def get_shows(current_user: dict = Depends(get_current_user)):
-    shows = await db.shows.find({"user_id": current_user['id']}, {"_id": 0}).to_list(1000)
+async def get_shows(include_archived: bool = False, current_user: dict = Depends(get_current_user)):
+    shows = with_pending("shows", await find_with_archive("shows", {"user_id": current_user['id']}, include_archived))
     for show in shows:
         if isinstance(show['created_at'], str):
             show['created_at'] = datetime.fromisoformat(show['created_at'])
     return shows
 
 @api_router.get("/shows/{show_id}", response_model=Show)
-async def get_show(show_id: str, current_user: dict = Depends(get_current_user)):
-    show = await db.shows.find_one({"id": show_id, "user_id": current_user['id']}, {"_id": 0})
+async def get_show(show_id: str, include_archived: bool = False, current_user: dict = Depends(get_current_user)):
+    show = with_pending_one("shows", await find_one_with_archive("shows", {"id": show_id, "user_id": current_user['id']}, include_archived))
     if not show:
         raise HTTPException(status_code=404, detail="Show not found")
     if isinstance(show['created_at'], str):
@@ -402,27 +900,31 @@ async def get_show(show_id: str, current_user: dict = Depends(get_current_user))
 
 @api_router.put("/shows/{show_id}", response_model=Show)
 async def update_show(show_id: str, show_data: ShowCreate, current_user: dict = Depends(get_current_user)):
-    existing = await db.shows.find_one({"id": show_id, "user_id": current_user['id']}, {"_id": 0})
+    existing = with_pending_one("shows", await db.shows.find_one({"id": show_id, "user_id": current_user['id']}, {"_id": 0}))
     if not existing:
         raise HTTPException(status_code=404, detail="Show not found")
     
-    update_data = show_data.model_dump()
-    await db.shows.update_one({"id": show_id}, {"$set": update_data})
-    updated = await db.shows.find_one({"id": show_id}, {"_id": 0})
+    update_data = stamp_status_change(existing, show_data.model_dump())
+    updated = await update_document("shows", show_id, existing, update_data)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Show not found")
+    record_change(current_user['id'], "shows", "update", show_id, update_data)
     if isinstance(updated['created_at'], str):
         updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     return updated
 
 @api_router.delete("/shows/{show_id}")
 async def delete_show(show_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.shows.delete_one({"id": show_id, "user_id": current_user['id']})
-    if result.deleted_count == 0:
+    if not await delete_with_archive("shows", {"id": show_id, "user_id": current_user['id']}):
         raise HTTPException(status_code=404, detail="Show not found")
+    discard_pending("shows", show_id)
+    record_change(current_user['id'], "shows", "delete", show_id)
     return {"message": "Show deleted successfully"}
 
 @api_router.get("/shows/popular/list", response_model=List[Show])
 async def get_popular_shows(current_user: dict = Depends(get_current_user)):
     """Get popular shows (most recent active shows)"""
+    await flush_pending("shows")
     shows = await db.shows.find({"user_id": current_user['id'], "status": "active"}, {"_id": 0}).sort("created_at", -1).limit(6).to_list(6)
     for show in shows:
         if isinstance(show['created_at'], str):
@@ -437,22 +939,25 @@ async def create_episode(episode_data: EpisodeCreate, current_user: dict = Depen
     doc = episode.model_dump()
     doc['published_at'] = doc['published_at'].isoformat()
     await db.episodes.insert_one(doc)
+    record_change(current_user['id'], "episodes", "create", episode.id, episode.model_dump(mode="json"))
+    queue_media_probe(doc)
     return episode
 
 @api_router.get("/episodes", response_model=List[Episode])
-async def get_episodes(show_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+async def get_episodes(show_id: Optional[str] = None, include_archived: bool = False, current_user: dict = Depends(get_current_user)):
     query = {"user_id": current_user['id']}
     if show_id:
         query["show_id"] = show_id
-    episodes = await db.episodes.find(query, {"_id": 0}).to_list(1000)
+        await flush_pending("episodes")
+    episodes = with_pending("episodes", await find_with_archive("episodes", query, include_archived))
     for episode in episodes:
         if isinstance(episode['published_at'], str):
             episode['published_at'] = datetime.fromisoformat(episode['published_at'])
     return episodes
 
 @api_router.get("/episodes/{episode_id}", response_model=Episode)
-async def get_episode(episode_id: str, current_user: dict = Depends(get_current_user)):
-    episode = await db.episodes.find_one({"id": episode_id, "user_id": current_user['id']}, {"_id": 0})
+async def get_episode(episode_id: str, include_archived: bool = False, current_user: dict = Depends(get_current_user)):
+    episode = with_pending_one("episodes", await find_one_with_archive("episodes", {"id": episode_id, "user_id": current_user['id']}, include_archived))
     if not episode:
         raise HTTPException(status_code=404, detail="Episode not found")
     if isinstance(episode['published_at'], str):
@@ -461,27 +966,41 @@ async def get_episode(episode_id: str, current_user: dict = Depends(get_current_
 
 @api_router.put("/episodes/{episode_id}", response_model=Episode)
 async def update_episode(episode_id: str, episode_data: EpisodeCreate, current_user: dict = Depends(get_current_user)):
-    existing = await db.episodes.find_one({"id": episode_id, "user_id": current_user['id']}, {"_id": 0})
+    existing = with_pending_one("episodes", await db.episodes.find_one({"id": episode_id, "user_id": current_user['id']}, {"_id": 0}))
     if not existing:
         raise HTTPException(status_code=404, detail="Episode not found")
     
-    update_data = episode_data.model_dump()
-    await db.episodes.update_one({"id": episode_id}, {"$set": update_data})
-    updated = await db.episodes.find_one({"id": episode_id}, {"_id": 0})
+    update_data = stamp_status_change(existing, episode_data.model_dump())
+    updated = await update_document("episodes", episode_id, existing, update_data)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Episode not found")
+    record_change(current_user['id'], "episodes", "update", episode_id, update_data)
+    queue_media_probe({**existing, **update_data})
     if isinstance(updated['published_at'], str):
         updated['published_at'] = datetime.fromisoformat(updated['published_at'])
     return updated
 
 @api_router.delete("/episodes/{episode_id}")
 async def delete_episode(episode_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.episodes.delete_one({"id": episode_id, "user_id": current_user['id']})
-    if result.deleted_count == 0:
+    if not await delete_with_archive("episodes", {"id": episode_id, "user_id": current_user['id']}):
         raise HTTPException(status_code=404, detail="Episode not found")
+    discard_pending("episodes", episode_id)
+    await db.waveforms.delete_one({"episode_id": episode_id})
+    record_change(current_user['id'], "episodes", "delete", episode_id)
     return {"message": "Episode deleted successfully"}
 
+@api_router.get("/episodes/{episode_id}/waveform")
+async def get_episode_waveform(episode_id: str, current_user: dict = Depends(get_current_user)):
+    """Downsampled peak amplitudes (0..1) of the episode's media for the player"""
+    waveform = await db.waveforms.find_one({"episode_id": episode_id, "user_id": current_user['id']}, {"_id": 0, "peaks": 1})
+    if not waveform:
+        raise HTTPException(status_code=404, detail="Waveform not available")
+    return {"episode_id": episode_id, "peaks": waveform['peaks']}
+
 @api_router.get("/episodes/popular/list", response_model=List[Episode])
 async def get_popular_episodes(current_user: dict = Depends(get_current_user)):
     """Get popular episodes (most recent published episodes)"""
+    await flush_pending("episodes")
     episodes = await db.episodes.find({"user_id": current_user['id'], "status": "published"}, {"_id": 0}).sort("published_at", -1).limit(6).to_list(6)
     for episode in episodes:
         if isinstance(episode['published_at'], str):
@@ -492,23 +1011,24 @@ async def get_popular_episodes(current_user: dict = Depends(get_current_user)):
 
 @api_router.post("/advertisers", response_model=Advertiser)
 async def create_advertiser(advertiser_data: AdvertiserCreate, current_user: dict = Depends(get_current_user)):
-    advertiser = Advertiser(**advertiser_data.model_dump(), user_id=current_user['id'])
+    advertiser = Advertiser(**advertiser_data.model_dump(exclude_none=True), user_id=current_user['id'])
     doc = advertiser.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.advertisers.insert_one(doc)
+    record_change(current_user['id'], "advertisers", "create", advertiser.id, advertiser.model_dump(mode="json"))
     return advertiser
 
 @api_router.get("/advertisers", response_model=List[Advertiser])
-async def get_advertisers(current_user: dict = Depends(get_current_user)):
-    advertisers = await db.advertisers.find({"user_id": current_user['id']}, {"_id": 0}).to_list(1000)
+async def get_advertisers(include_archived: bool = False, current_user: dict = Depends(get_current_user)):
+    advertisers = await find_with_archive("advertisers", {"user_id": current_user['id']}, include_archived)
     for advertiser in advertisers:
         if isinstance(advertiser['created_at'], str):
             advertiser['created_at'] = datetime.fromisoformat(advertiser['created_at'])
     return advertisers
 
 @api_router.get("/advertisers/{advertiser_id}", response_model=Advertiser)
-async def get_advertiser(advertiser_id: str, current_user: dict = Depends(get_current_user)):
-    advertiser = await db.advertisers.find_one({"id": advertiser_id, "user_id": current_user['id']}, {"_id": 0})
+async def get_advertiser(advertiser_id: str, include_archived: bool = False, current_user: dict = Depends(get_current_user)):
+    advertiser = await find_one_with_archive("advertisers", {"id": advertiser_id, "user_id": current_user['id']}, include_archived)
     if not advertiser:
         raise HTTPException(status_code=404, detail="Advertiser not found")
     if isinstance(advertiser['created_at'], str):
@@ -521,18 +1041,21 @@ async def update_advertiser(advertiser_id: str, advertiser_data: AdvertiserCreat
     if not existing:
         raise HTTPException(status_code=404, detail="Advertiser not found")
     
-    update_data = advertiser_data.model_dump()
+    update_data = stamp_status_change(existing, advertiser_data.model_dump(exclude_unset=True, exclude_none=True))
     await db.advertisers.update_one({"id": advertiser_id}, {"$set": update_data})
+    record_change(current_user['id'], "advertisers", "update", advertiser_id, update_data)
     updated = await db.advertisers.find_one({"id": advertiser_id}, {"_id": 0})
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Advertiser not found")
     if isinstance(updated['created_at'], str):
         updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     return updated
 
 @api_router.delete("/advertisers/{advertiser_id}")
 async def delete_advertiser(advertiser_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.advertisers.delete_one({"id": advertiser_id, "user_id": current_user['id']})
-    if result.deleted_count == 0:
+    if not await delete_with_archive("advertisers", {"id": advertiser_id, "user_id": current_user['id']}):
         raise HTTPException(status_code=404, detail="Advertiser not found")
+    record_change(current_user['id'], "advertisers", "delete", advertiser_id)
     return {"message": "Advertiser deleted successfully"}
 
 @api_router.get("/advertisers/popular/list", response_model=List[Advertiser])
@@ -544,6 +1067,206 @@ async def get_popular_advertisers(current_user: dict = Depends(get_current_user)
             advertiser['created_at'] = datetime.fromisoformat(advertiser['created_at'])
     return advertisers
 
+# ==================== CHANGE FEED ====================
+
+def create_stream_ticket(user_id: str) -> str:
+    # No "sub" claim, so a ticket is never accepted as an access token
+    expire = datetime.now(timezone.utc) + timedelta(seconds=CHANGE_FEED_TICKET_SECONDS)
+    return jwt.encode({"stream_user": user_id, "purpose": "changes", "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+async def get_stream_user(
+    request: Request,
+    ticket: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Like get_current_user, but also accepts ?ticket= since EventSource cannot set headers"""
+    if credentials is not None:
+        return await get_current_user(request, credentials)
+    if not ticket:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired ticket")
+    if payload.get("purpose") != "changes" or not payload.get("stream_user"):
+        raise HTTPException(status_code=401, detail="Invalid or expired ticket")
+    user = await db.users.find_one({"id": payload["stream_user"]}, {"_id": 0})
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+@api_router.post("/changes/ticket")
+async def create_changes_ticket(current_user: dict = Depends(get_current_user)):
+    """Short-lived ticket for opening /api/changes, keeping the access token out of URLs and logs"""
+    return {"ticket": create_stream_ticket(current_user['id']), "expires_in": CHANGE_FEED_TICKET_SECONDS}
+
+@api_router.get("/changes")
+async def stream_changes(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    current_user: dict = Depends(get_stream_user)
+):
+    """Server-Sent Events feed of create/update/delete deltas for the user's data"""
+    if CHANGE_FEED_SOURCE not in ('local', 'mongo'):
+        raise HTTPException(status_code=404, detail="Change feed disabled")
+    if change_broker.connection_count >= CHANGE_FEED_MAX_CONNECTIONS:
+        raise HTTPException(status_code=503, detail="Too many change feed connections", headers={"Retry-After": "30"})
+
+    # Browsers resend the last seen id in this header when EventSource reconnects
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        event_stream(change_broker, current_user['id'], last_event_id, change_source, CHANGE_FEED_HEARTBEAT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ==================== AD PLACEMENTS ====================
+
+async def load_placement_inputs(user_id: str):
+    advertisers, episodes, shows, archived_shows = await asyncio.gather(
+        db.advertisers.find(
+            {"user_id": user_id},
+            {"_id": 0, "id": 1, "budget": 1, "status": 1, "target_categories": 1}
+        ).to_list(None),
+        db.episodes.find(
+            {"user_id": user_id},
+            {"_id": 0, "id": 1, "show_id": 1, "duration_minutes": 1, "status": 1}
+        ).to_list(None),
+        db.shows.find({"user_id": user_id}, {"_id": 0, "id": 1, "category": 1}).to_list(None),
+        # Episodes of completed shows stay hot and still need their show's category
+        db[cold_name("shows")].find({"user_id": user_id}, {"_id": 0, "id": 1, "category": 1}).to_list(None),
+    )
+    shows = merge_tiers(shows, archived_shows)
+    return with_pending("advertisers", advertisers), with_pending("episodes", episodes), with_pending("shows", shows)
+
+ad_placement_engine = AdPlacementEngine(
+    load_placement_inputs,
+    SlotPricing(
+        pre_roll=AD_PRICE_PRE_ROLL,
+        mid_roll=AD_PRICE_MID_ROLL,
+        post_roll=AD_PRICE_POST_ROLL,
+        mid_roll_every_minutes=AD_MID_ROLL_EVERY_MINUTES,
+        max_mid_rolls=AD_MAX_MID_ROLLS,
+    ),
+    max_users=AD_PLACEMENT_CACHED_USERS,
+    ttl=AD_PLACEMENT_TTL_SECONDS,
+)
+# Cached placements are repaired from the same events that feed /api/changes
+change_broker.add_listener(ad_placement_engine.apply)
+
+@api_router.get("/ad-placements")
+async def get_ad_placements(
+    episode_id: Optional[str] = None,
+    recompute: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Allocate active advertisers' budgets to ad slots of published episodes"""
+    state = await ad_placement_engine.get(current_user['id'], recompute=recompute)
+    summary = state.summary()
+    if episode_id:
+        summary["placements"] = [p for p in summary["placements"] if p["episode_id"] == episode_id]
+    return summary
+
+# ==================== RSS FEEDS ====================
+
+async def load_feed_inputs(show_id: str):
+    # Completed shows keep their public feed after moving to the cold tier
+    show = with_pending_one("shows", await find_one_with_archive("shows", {"id": show_id}, include_archived=True))
+    if not show:
+        return None
+    await flush_pending("episodes")
+    # Nothing stops a user from referencing another user's show or host id, so
+    # only the show owner's documents may appear in its public feed
+    host, episodes = await asyncio.gather(
+        db.hosts.find_one({"id": show['host_id'], "user_id": show['user_id']}, {"_id": 0}),
+        db.episodes.find(
+            {"show_id": show_id, "user_id": show['user_id'], "status": "published"}, {"_id": 0}
+        ).sort("published_at", -1).to_list(None),
+    )
+    return show, host, with_pending("episodes", episodes)
+
+feed_cache = FeedCache(load_feed_inputs, ttl=FEED_CACHE_TTL_SECONDS, max_feeds=FEED_CACHED_SHOWS)
+change_broker.add_listener(feed_cache.apply)
+
+@app.get("/feeds/{show_id}.xml")
+async def get_show_feed(show_id: str, request: Request):
+    """Public iTunes-compatible RSS feed of a show's published episodes"""
+    base_url = PUBLIC_BASE_URL or str(request.base_url)
+    feed = await feed_cache.get(
+        show_id,
+        feed_url=str(request.url.replace(query="")),
+        site_url=os.environ.get('FRONTEND_URL', 'http://localhost:3000'),
+        base_url=base_url,
+    )
+    if feed is None:
+        raise HTTPException(status_code=404, detail="Show not found")
+
+    headers = {
+        "ETag": feed.etag,
+        "Last-Modified": format_datetime(feed.last_modified, usegmt=True),
+        "Cache-Control": "public, max-age=300",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, feed.etag)
+    elif if_modified_since is not None:
+        try:
+            not_modified = feed.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=feed.body, media_type="application/rss+xml", headers=headers)
+
+# ==================== ARCHIVE ====================
+
+def record_archived(collection: str, user_ids):
+    for user_id in user_ids:
+        record_bulk_change(user_id, collection)
+
+archiver = Archiver(
+    lambda: db,
+    ARCHIVE_TIERS,
+    min_age=timedelta(days=ARCHIVE_AFTER_DAYS),
+    batch_size=ARCHIVE_BATCH_SIZE,
+    interval=ARCHIVE_INTERVAL_MINUTES * 60,
+    on_moved=record_archived,
+    prepare=flush_pending,
+)
+
+@api_router.post("/archive/{collection}/{doc_id}/restore")
+async def restore_archived(collection: str, doc_id: str, current_user: dict = Depends(get_current_user)):
+    """Move an archived episode, show or advertiser back to the hot collection"""
+    if collection not in archiver.tiers:
+        raise HTTPException(status_code=404, detail="Collection is not archived")
+    doc = await archiver.restore(collection, current_user['id'], doc_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Archived document not found")
+    record_change(current_user['id'], collection, "create", doc_id, doc)
+    return doc
+
+# ==================== BATCH ====================
+
+@api_router.post("/batch")
+async def batch_requests(batch: BatchRequest, request: Request, current_user: dict = Depends(get_current_user)):
+    """Run several GET requests against this API concurrently, authenticating once"""
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {BATCH_MAX_REQUESTS} requests")
+    responses = await run_batch(
+        batch_target,
+        request.scope,
+        [sub_request.model_dump() for sub_request in batch.requests],
+        state={"batch_user": current_user},
+        # Streams never finish and batches must not nest
+        excluded_paths=("/api/batch", "/api/changes"),
+    )
+    return {"responses": responses}
+
 # ==================== CLEAR USER DATA ====================
 
 @api_router.delete("/clear-all-data")
@@ -556,14 +1279,20 @@ async def clear_all_user_data(current_user: dict = Depends(get_current_user)):
     shows_deleted = await db.shows.delete_many({"user_id": user_id})
     episodes_deleted = await db.episodes.delete_many({"user_id": user_id})
     advertisers_deleted = await db.advertisers.delete_many({"user_id": user_id})
+    await db.waveforms.delete_many({"user_id": user_id})
+    archived_deleted = {
+        tier.collection: (await db[cold_name(tier.collection)].delete_many({"user_id": user_id})).deleted_count
+        for tier in ARCHIVE_TIERS
+    }
+    record_bulk_change(user_id, *VERSIONED_COLLECTIONS)
     
     return {
         "message": "All data cleared successfully",
         "deleted": {
             "hosts": hosts_deleted.deleted_count,
-            "shows": shows_deleted.deleted_count,
-            "episodes": episodes_deleted.deleted_count,
-            "advertisers": advertisers_deleted.deleted_count
+            "shows": shows_deleted.deleted_count + archived_deleted["shows"],
+            "episodes": episodes_deleted.deleted_count + archived_deleted["episodes"],
+            "advertisers": advertisers_deleted.deleted_count + archived_deleted["advertisers"]
         }
     }
 
@@ -585,6 +1314,9 @@ async def initialize_default_data(current_user: dict = Depends(get_current_user)
             await db.shows.delete_many({"user_id": user_id})
             await db.episodes.delete_many({"user_id": user_id})
             await db.advertisers.delete_many({"user_id": user_id})
+            await db.waveforms.delete_many({"user_id": user_id})
+            for tier in ARCHIVE_TIERS:
+                await db[cold_name(tier.collection)].delete_many({"user_id": user_id})
     
     # Create default hosts
     default_hosts = [
@@ -962,6 +1694,7 @@ async def initialize_default_data(current_user: dict = Depends(get_current_user)
         doc['created_at'] = doc['created_at'].isoformat()
         advertiser_docs.append(doc)
     await db.advertisers.insert_many(advertiser_docs)
+    record_bulk_change(user_id, *VERSIONED_COLLECTIONS)
     
     return {
         "message": "Indian podcast sample data initialized successfully",
@@ -977,6 +1710,56 @@ async def initialize_default_data(current_user: dict = Depends(get_current_user)
 # Include router
 app.include_router(api_router)
 
+# Middleware that depends on the route, outermost last. Each /api/batch
+# sub-request goes through it too, so batched reads get ETags, secondary
+# reads and per-route rate limits like direct ones.
+route_middleware = []
+if CONDITIONAL_GET_ENABLED:
+    route_middleware.append((ConditionalGetMiddleware, dict(
+        versions=collection_versions,
+        user_id_resolver=user_id_from_authorization,
+        collections=VERSIONED_COLLECTIONS,
+    )))
+if read_router is not None:
+    route_middleware.append((ReadRoutingMiddleware, dict(router=read_router, user_id_resolver=user_id_from_authorization)))
+
+for middleware_class, options in route_middleware:
+    app.add_middleware(middleware_class, **options)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    encodings=COMPRESSION_ENCODINGS,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+    content_types=("application/json", "application/rss+xml"),
+)
+
+if RATE_LIMIT_ENABLED:
+    rate_limit_backend = MemoryRateLimitBackend()
+    shared_rate_limit_backend = None
+    if RATE_LIMIT_BACKEND == 'mongo':
+        shared_rate_limit_backend = MongoRateLimitBackend(lambda: db.rate_limits)
+    rate_limit_options = dict(
+        backend=rate_limit_backend,
+        rules=RATE_LIMIT_RULES,
+        user_id_resolver=user_id_from_authorization,
+        shared_backend=shared_rate_limit_backend,
+        shared_rules=RATE_LIMIT_SHARED_RULES,
+        proxy_hops=RATE_LIMIT_PROXY_HOPS,
+    )
+    app.add_middleware(RateLimitMiddleware, **rate_limit_options)
+    route_middleware.append((RateLimitMiddleware, rate_limit_options))
+
+if MAX_IN_FLIGHT > 0:
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        max_in_flight=MAX_IN_FLIGHT,
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+        # Long-lived streams would otherwise hold a slot for their whole lifetime
+        exempt_paths=("/api/changes",),
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -985,12 +1768,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# HTTPExceptions of sub-requests still need turning into responses
+batch_target = ExceptionMiddleware(app.router, handlers=app.exception_handlers)
+for middleware_class, options in route_middleware:
+    batch_target = middleware_class(batch_target, **options)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+logger = logging.getLogger(__name__)
\ No newline at end of file
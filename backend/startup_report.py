@@ -0,0 +1,99 @@
+"""Measure cold start: per-module import cost and time until the API answers.
+
+Usage (from the backend directory):
+    python startup_report.py [--top 15] [--budget-ms 3000] [--skip-serve]
+
+Import costs come from ``python -X importtime -c "import server"`` and are
+cumulative per module imported directly by ``server`` (so ``fastapi`` includes
+pydantic, starlette, ...). Time to ready is the wall clock from spawning
+uvicorn until ``/api/health`` answers. Exits non-zero when the time to ready
+exceeds the budget, so it can gate CI or a deploy.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+COLD_START_BUDGET_MS = float(os.environ.get('COLD_START_BUDGET_MS', '3000'))
+
+
+def measure_imports():
+    """Return (total_ms, [(module, cumulative_ms), ...]) for `import server`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    total_ms = 0.0
+    direct = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        cumulative_ms = int(cumulative) / 1000
+        if name.strip() == "server":
+            total_ms = cumulative_ms
+        # Direct dependencies of server are nested exactly one level deep
+        elif name.startswith("   ") and not name.startswith("    "):
+            direct.append((name.strip(), cumulative_ms))
+    direct.sort(key=lambda item: item[1], reverse=True)
+    return total_ms, direct
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_ready(timeout: float = 30.0) -> float:
+    """Spawn uvicorn and return milliseconds until /api/health responds"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"server did not become ready within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="number of imports to list")
+    parser.add_argument("--budget-ms", type=float, default=COLD_START_BUDGET_MS)
+    parser.add_argument("--skip-serve", action="store_true", help="only measure imports")
+    args = parser.parse_args()
+
+    total_ms, direct = measure_imports()
+    print(f"import server: {total_ms:8.1f} ms")
+    for name, cumulative_ms in direct[:args.top]:
+        print(f"  {name:<45} {cumulative_ms:8.1f} ms")
+
+    if args.skip_serve:
+        return 0
+
+    ready_ms = measure_ready()
+    verdict = "OK" if ready_ms <= args.budget_ms else "OVER BUDGET"
+    print(f"time to first ready: {ready_ms:.1f} ms (budget {args.budget_ms:.0f} ms) {verdict}")
+    return 0 if ready_ms <= args.budget_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
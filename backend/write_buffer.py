@@ -0,0 +1,101 @@
+"""Write-behind coalescing of ``$set`` updates for a collection."""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Buffer per-document ``$set`` updates and flush them with one ``bulk_write``.
+
+    Updates to the same document within ``window`` seconds are merged, so a
+    burst of edits costs a single write. Pending and in-flight state is kept
+    in this process and overlaid on documents read back from Mongo, which
+    gives read-your-writes for requests served by the same worker. Reads that
+    filter or sort on buffered fields should call ``barrier()`` first.
+    """
+
+    def __init__(self, get_collection: Callable[[], Any], window: float = 0.25, max_pending: int = 500):
+        self.get_collection = get_collection
+        self.window = window
+        self.max_pending = max_pending
+        self._pending: Dict[str, dict] = {}
+        self._flushing: Dict[str, dict] = {}
+        self._timer = None
+        self._lock = asyncio.Lock()
+        self.writes_buffered = 0
+        self.writes_flushed = 0
+
+    async def update(self, doc_id: str, fields: dict):
+        self._pending.setdefault(doc_id, {}).update(fields)
+        self.writes_buffered += 1
+        if len(self._pending) >= self.max_pending:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    def discard(self, doc_id: str):
+        """Drop buffered changes for a document that has been deleted"""
+        self._pending.pop(doc_id, None)
+
+    def overlay(self, doc: dict) -> dict:
+        """Return ``doc`` with any not-yet-written changes applied"""
+        doc_id = doc.get("id")
+        if doc_id in self._flushing:
+            doc.update(self._flushing[doc_id])
+        if doc_id in self._pending:
+            doc.update(self._pending[doc_id])
+        return doc
+
+    def overlay_many(self, docs: List[dict]) -> List[dict]:
+        if self._pending or self._flushing:
+            for doc in docs:
+                self.overlay(doc)
+        return docs
+
+    async def barrier(self):
+        """Make every buffered change visible to Mongo queries.
+
+        Raises if the flush fails, since the query would otherwise miss changes
+        that were already acknowledged to clients.
+        """
+        if self._pending or self._flushing:
+            await self.flush(raise_errors=True)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self, raise_errors: bool = False):
+        async with self._lock:
+            if not self._pending:
+                return
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+                self._timer = None
+            self._flushing, self._pending = self._pending, {}
+            operations = [UpdateOne({"id": doc_id}, {"$set": fields}) for doc_id, fields in self._flushing.items()]
+            try:
+                await self.get_collection().bulk_write(operations, ordered=False)
+                self.writes_flushed += len(operations)
+            except Exception:
+                logger.exception("Write-behind flush of %d documents failed, will retry", len(operations))
+                # Newer changes buffered meanwhile win over the failed batch
+                for doc_id, fields in self._flushing.items():
+                    self._pending[doc_id] = {**fields, **self._pending.get(doc_id, {})}
+                if self._timer is None:
+                    self._timer = asyncio.create_task(self._flush_later())
+                if raise_errors:
+                    raise
+            finally:
+                self._flushing = {}
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
@@ -11,6 +11,7 @@ import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from
 import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { toast } from 'sonner';
+import { getImageUrl } from '@/lib/utils';
 import DashboardOverview from '@/components/dashboard/DashboardOverview';
 import VideoPlayer from '@/components/VideoPlayer';
 import './App.css';
@@ -228,10 +229,8 @@ const Dashboard = () => {
     const isDark = localStorage.getItem('darkMode') === 'true';
     setDarkMode(isDark);
     document.documentElement.classList.toggle('dark', isDark);
+    // On the overview tab this also loads the popular lists
     fetchData();
-    if (activeTab === 'overview') {
-      fetchPopularData();
-    }
   }, [activeTab]);
 
   const toggleDarkMode = () => {
@@ -246,22 +245,32 @@ const Dashboard = () => {
     return { headers: { Authorization: `Bearer ${token}` } };
   };
 
+  // Fetch several GET endpoints in one round trip through /api/batch
+  const fetchBatch = async (paths) => {
+    const { data } = await axios.post(`${API}/batch`, { requests: paths.map((path) => ({ path })) }, getAuthHeaders());
+    const failed = data.responses.find((response) => response.status >= 400);
+    if (failed) {
+      throw new Error(`Batched request ${paths[Number(failed.id)]} failed with status ${failed.status}`);
+    }
+    return data.responses.map((response) => response.body);
+  };
+
+  const POPULAR_PATHS = ['/api/hosts/popular/list', '/api/shows/popular/list', '/api/episodes/popular/list', '/api/advertisers/popular/list'];
+
+  const applyPopularData = ([popularHosts, popularShows, popularEpisodes, popularAdvertisers]) => {
+    setPopularHosts(popularHosts);
+    setPopularShows(popularShows);
+    setPopularEpisodes(popularEpisodes);
+    setPopularAdvertisers(popularAdvertisers);
+
+    // Show init button if no data
+    const hasData = popularHosts.length > 0 || popularShows.length > 0;
+    setShowInitButton(!hasData);
+  };
+
   const fetchPopularData = async () => {
     try {
-      const [hostsRes, showsRes, episodesRes, advertisersRes] = await Promise.all([
-        axios.get(`${API}/hosts/popular/list`, getAuthHeaders()),
-        axios.get(`${API}/shows/popular/list`, getAuthHeaders()),
-        axios.get(`${API}/episodes/popular/list`, getAuthHeaders()),
-        axios.get(`${API}/advertisers/popular/list`, getAuthHeaders())
-      ]);
-      setPopularHosts(hostsRes.data);
-      setPopularShows(showsRes.data);
-      setPopularEpisodes(episodesRes.data);
-      setPopularAdvertisers(advertisersRes.data);
-      
-      // Show init button if no data
-      const hasData = hostsRes.data.length > 0 || showsRes.data.length > 0;
-      setShowInitButton(!hasData);
+      applyPopularData(await fetchBatch(POPULAR_PATHS));
     } catch (error) {
       console.error('Failed to fetch popular data', error);
     }
@@ -299,18 +308,14 @@ const Dashboard = () => {
   const fetchData = async () => {
     try {
       if (activeTab === 'overview') {
-        // Fetch all data for overview
-        const [hostsRes, showsRes, episodesRes, advertisersRes] = await Promise.all([
-          axios.get(`${API}/hosts`, getAuthHeaders()),
-          axios.get(`${API}/shows`, getAuthHeaders()),
-          axios.get(`${API}/episodes`, getAuthHeaders()),
-          axios.get(`${API}/advertisers`, getAuthHeaders())
-        ]);
-        setHosts(hostsRes.data);
-        setShows(showsRes.data);
-        setEpisodes(episodesRes.data);
-        setAdvertisers(advertisersRes.data);
-        await fetchPopularData();
+        // Fetch all data for overview, popular lists included, in a single request
+        const results = await fetchBatch(['/api/hosts', '/api/shows', '/api/episodes', '/api/advertisers', ...POPULAR_PATHS]);
+        const [hostsData, showsData, episodesData, advertisersData] = results;
+        setHosts(hostsData);
+        setShows(showsData);
+        setEpisodes(episodesData);
+        setAdvertisers(advertisersData);
+        applyPopularData(results.slice(4));
       } else if (activeTab === 'hosts') {
         const { data } = await axios.get(`${API}/hosts`, getAuthHeaders());
         setHosts(data);
@@ -539,7 +544,7 @@ const OverviewSection = ({ popularHosts, popularShows, popularEpisodes, popularA
                   <div className="card-avatar">
                     {host.image_url ? (
                       <img 
-                        src={`${BACKEND_URL}${host.image_url.startsWith('http') ? host.image_url.replace(/^https?:\/\/[^\/]+/, '') : host.image_url}`} 
+                        src={getImageUrl(host.image_url)} 
                         alt={host.name}
                         style={{ width: '100%', height: '100%', objectFit: 'cover', borderRadius: '8px' }}
                         onError={(e) => {
@@ -577,7 +582,7 @@ const OverviewSection = ({ popularHosts, popularShows, popularEpisodes, popularA
               >
                 <Card className="popular-card">
                   <div className="card-avatar">
-                    {show.cover_image_url ? <img src={show.cover_image_url} alt={show.title} /> : <Radio size={32} />}
+                    {show.cover_image_url ? <img src={getImageUrl(show.cover_image_url)} alt={show.title} /> : <Radio size={32} />}
                   </div>
                   <h3>{show.title}</h3>
                   <p className="category">Category: {show.category}</p>
@@ -658,15 +663,6 @@ const HostsSection = ({ hosts, onRefresh, onDelete, getAuthHeaders }) => {
   const [imageFile, setImageFile] = useState(null);
   const [imagePreview, setImagePreview] = useState(null);
 
-  // Helper function to get full image URL
-  const getFullImageUrl = (imageUrl) => {
-    if (!imageUrl) return null;
-    if (imageUrl.startsWith('http://') || imageUrl.startsWith('https://')) {
-      return imageUrl;
-    }
-    return `${BACKEND_URL}${imageUrl}`;
-  };
-
   const handleImageChange = async (e) => {
     const file = e.target.files[0];
     if (file) {
@@ -732,7 +728,7 @@ const HostsSection = ({ hosts, onRefresh, onDelete, getAuthHeaders }) => {
       email: host.email,
       image_url: host.image_url || ''
     });
-    setImagePreview(host.image_url ? getFullImageUrl(host.image_url) : null);
+    setImagePreview(host.image_url ? getImageUrl(host.image_url) : null);
     setImageFile(null);
     setEditMode(true);
     setOpen(true);
@@ -802,7 +798,7 @@ const HostsSection = ({ hosts, onRefresh, onDelete, getAuthHeaders }) => {
               <div className="card-avatar">
                 {host.image_url ? (
                   <img 
-                    src={getFullImageUrl(host.image_url)} 
+                    src={getImageUrl(host.image_url)} 
                     alt={host.name}
                     style={{ width: '100%', height: '100%', objectFit: 'cover', borderRadius: '8px' }}
                     onError={(e) => {
@@ -946,7 +942,7 @@ const ShowsSection = ({ shows, hosts, onRefresh, onDelete, getAuthHeaders }) =>
         {shows.map((show) => (
           <Card key={show.id} className="item-card" data-testid={`show-card-${show.id}`}>
             <div className="card-header">
-              <div className="card-avatar">{show.cover_image_url ? <img src={show.cover_image_url} alt={show.title} /> : <Radio size={32} />}</div>
+              <div className="card-avatar">{show.cover_image_url ? <img src={getImageUrl(show.cover_image_url)} alt={show.title} /> : <Radio size={32} />}</div>
               <div className="card-actions">
                 <button onClick={() => handleEdit(show)} data-testid={`edit-show-${show.id}`}><Edit2 size={18} /></button>
                 <button onClick={() => onDelete('shows', show.id)} data-testid={`delete-show-${show.id}`}><Trash2 size={18} /></button>
@@ -1139,7 +1135,7 @@ const EpisodesSection = ({ episodes, shows, onRefresh, onDelete, getAuthHeaders
             <div className="card-header">
               <div className="card-avatar">
                 {episode.thumbnail_url ? (
-                  <img src={episode.thumbnail_url} alt={episode.title} style={{ width: '100%', height: '100%', objectFit: 'cover', borderRadius: '8px' }} />
+                  <img src={getImageUrl(episode.thumbnail_url)} alt={episode.title} style={{ width: '100%', height: '100%', objectFit: 'cover', borderRadius: '8px' }} />
                 ) : (
                   <Mic2 size={32} />
                 )}
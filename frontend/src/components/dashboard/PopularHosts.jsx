@@ -8,22 +8,12 @@ import { Textarea } from '@/components/ui/textarea';
 import { Label } from '@/components/ui/label';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { toast } from 'sonner';
+import { getImageUrl } from '@/lib/utils';
 import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
-// Helper function to get full image URL
-const getFullImageUrl = (imageUrl) => {
-  if (!imageUrl) return null;
-  // If it's already a full URL, return as is
-  if (imageUrl.startsWith('http://') || imageUrl.startsWith('https://')) {
-    return imageUrl;
-  }
-  // If it's a relative path, prepend the backend URL
-  return `${BACKEND_URL}${imageUrl}`;
-};
-
 const PopularHosts = ({ hosts, onRefresh, getAuthHeaders, onViewAll, showLimit = 3 }) => {
   const [open, setOpen] = useState(false);
   const [editMode, setEditMode] = useState(false);
@@ -114,7 +104,7 @@ const PopularHosts = ({ hosts, onRefresh, getAuthHeaders, onViewAll, showLimit =
       email: host.email,
       image_url: host.image_url || ''
     });
-    setImagePreview(host.image_url ? getFullImageUrl(host.image_url) : null);
+    setImagePreview(host.image_url ? getImageUrl(host.image_url) : null);
     setImageFile(null);
     setEditMode(true);
     setOpen(true);
@@ -241,7 +231,7 @@ const PopularHosts = ({ hosts, onRefresh, getAuthHeaders, onViewAll, showLimit =
                 <div className="card-image">
                   {host.image_url ? (
                     <img 
-                      src={getFullImageUrl(host.image_url)} 
+                      src={getImageUrl(host.image_url)} 
                       alt={host.name}
                       style={{ width: '100%', height: '100%', objectFit: 'cover' }}
                       onError={(e) => {
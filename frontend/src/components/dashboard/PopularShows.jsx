@@ -10,6 +10,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { Badge } from '@/components/ui/badge';
 import { toast } from 'sonner';
+import { getImageUrl } from '@/lib/utils';
 import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -226,7 +227,7 @@ const PopularShows = ({ shows, hosts, onRefresh, getAuthHeaders, onViewAll, show
               <Card className="popular-card show-card">
                 <div className="card-image">
                   {show.cover_image_url ? (
-                    <img src={show.cover_image_url} alt={show.title} />
+                    <img src={getImageUrl(show.cover_image_url)} alt={show.title} />
                   ) : (
                     <div className="placeholder-avatar">
                       <Radio size={32} />
@@ -4,3 +4,17 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Remote images go through the backend's caching proxy; uploads, even when
+// stored with an older backend origin, are served by this backend directly
+export function getImageUrl(imageUrl) {
+  if (!imageUrl) return null;
+  if (imageUrl.startsWith('http://') || imageUrl.startsWith('https://')) {
+    const path = imageUrl.replace(/^https?:\/\/[^\/]+/, '');
+    if (path.startsWith('/uploads/')) return `${BACKEND_URL}${path}`;
+    return `${BACKEND_URL}/api/img-proxy?url=${encodeURIComponent(imageUrl)}`;
+  }
+  return `${BACKEND_URL}${imageUrl}`;
+}
@@ -0,0 +1,238 @@
+import asyncio
+import copy
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from ad_placement import AdPlacementEngine, PlacementState, SlotPricing  # noqa: E402
+
+CATEGORIES = ["tech", "comedy", "news", "sports"]
+
+
+def catalogue(seed: int, shows: int = 12, episodes: int = 80, advertisers: int = 15):
+    """A random but reproducible user catalogue with tight budgets"""
+    rng = random.Random(seed)
+    show_docs = [{"id": f"s{n}", "category": rng.choice(CATEGORIES + [None])} for n in range(shows)]
+    episode_docs = [
+        {
+            "id": f"e{n}",
+            "show_id": f"s{rng.randrange(shows)}",
+            "duration_minutes": rng.randint(5, 70),
+            "status": rng.choice(["published", "published", "draft"]),
+        }
+        for n in range(episodes)
+    ]
+    advertiser_docs = [
+        {
+            "id": f"a{n}",
+            "budget": rng.choice([0, 250, 600, 1000, 2500, 6000]),
+            "status": rng.choice(["active", "active", "active", "paused"]),
+            "target_categories": rng.sample(CATEGORIES, rng.randint(0, 2)),
+        }
+        for n in range(advertisers)
+    ]
+    return advertiser_docs, episode_docs, show_docs
+
+
+def loaded(advertisers, episodes, shows) -> PlacementState:
+    state = PlacementState(SlotPricing())
+    state.load(copy.deepcopy(advertisers), copy.deepcopy(episodes), copy.deepcopy(shows))
+    return state
+
+
+def placements(state: PlacementState) -> dict:
+    state.repair()
+    return {(slot.episode_id, slot.position): advertiser_id for slot, advertiser_id in state.assignments.items()}
+
+
+def assert_same_as_reload(state: PlacementState, advertisers, episodes, shows):
+    reloaded = loaded(advertisers, episodes, shows)
+    assert placements(state) == placements(reloaded)
+    assert state.remaining == reloaded.remaining
+    assert len(state.unfilled) == len(reloaded.unfilled)
+
+
+def update(docs, doc_id, fields):
+    for doc in docs:
+        if doc["id"] == doc_id:
+            doc.update(fields)
+
+
+# ==================== INVARIANTS ====================
+
+@pytest.mark.parametrize("seed", range(5))
+def test_no_advertiser_overspends(seed):
+    advertisers, episodes, shows = catalogue(seed)
+    state = loaded(advertisers, episodes, shows)
+    spent = {}
+    for slot, advertiser_id in state.assignments.items():
+        spent[advertiser_id] = spent.get(advertiser_id, 0) + slot.price
+    budgets = {advertiser["id"]: advertiser["budget"] for advertiser in advertisers}
+    assert spent
+    for advertiser_id, amount in spent.items():
+        assert amount <= budgets[advertiser_id]
+        assert state.remaining[advertiser_id] == budgets[advertiser_id] - amount
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_advertisers_take_at_most_one_slot_per_episode(seed):
+    state = loaded(*catalogue(seed, advertisers=4))
+    seen = set()
+    for slot, advertiser_id in state.assignments.items():
+        assert (slot.episode_id, advertiser_id) not in seen
+        seen.add((slot.episode_id, advertiser_id))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_only_eligible_advertisers_fill_matching_slots(seed):
+    advertisers, episodes, shows = catalogue(seed)
+    state = loaded(advertisers, episodes, shows)
+    by_id = {advertiser["id"]: advertiser for advertiser in advertisers}
+    published = {episode["id"] for episode in episodes if episode["status"] == "published"}
+    for slot, advertiser_id in state.assignments.items():
+        advertiser = by_id[advertiser_id]
+        assert advertiser["status"] == "active"
+        assert slot.episode_id in published
+        assert not advertiser["target_categories"] or slot.category in advertiser["target_categories"]
+
+
+def test_allocation_does_not_depend_on_load_order():
+    advertisers, episodes, shows = catalogue(7)
+    state = loaded(advertisers, episodes, shows)
+    shuffled = loaded(advertisers[::-1], episodes[::-1], shows[::-1])
+    assert placements(state) == placements(shuffled)
+
+
+# ==================== INCREMENTAL REPAIR ====================
+
+@pytest.mark.parametrize("seed", range(5))
+def test_budget_cut_matches_full_reload(seed):
+    advertisers, episodes, shows = catalogue(seed)
+    state = loaded(advertisers, episodes, shows)
+    richest = max(advertisers, key=lambda advertiser: advertiser["budget"])["id"]
+    state.upsert_advertiser(richest, {"budget": 600})
+    update(advertisers, richest, {"budget": 600})
+    assert_same_as_reload(state, advertisers, episodes, shows)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_retarget_matches_full_reload(seed):
+    advertisers, episodes, shows = catalogue(seed)
+    state = loaded(advertisers, episodes, shows)
+    for advertiser in advertisers[:3]:
+        state.upsert_advertiser(advertiser["id"], {"target_categories": ["comedy"], "status": "active"})
+        update(advertisers, advertiser["id"], {"target_categories": ["comedy"], "status": "active"})
+        assert_same_as_reload(state, advertisers, episodes, shows)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_unpublish_and_republish_match_full_reload(seed):
+    advertisers, episodes, shows = catalogue(seed)
+    state = loaded(advertisers, episodes, shows)
+    for episode in episodes[:10]:
+        status = "draft" if episode["status"] == "published" else "published"
+        state.upsert_episode(episode["id"], {"status": status})
+        update(episodes, episode["id"], {"status": status})
+        assert_same_as_reload(state, advertisers, episodes, shows)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_show_recategorised_matches_full_reload(seed):
+    advertisers, episodes, shows = catalogue(seed)
+    state = loaded(advertisers, episodes, shows)
+    for show in shows[:4]:
+        state.upsert_show(show["id"], {"category": "tech"})
+        update(shows, show["id"], {"category": "tech"})
+        assert_same_as_reload(state, advertisers, episodes, shows)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_changes_match_full_reload(seed):
+    rng = random.Random(seed)
+    advertisers, episodes, shows = catalogue(seed)
+    state = loaded(advertisers, episodes, shows)
+    for step in range(40):
+        kind = rng.choice(["advertiser", "episode", "show", "new_advertiser", "remove_episode", "remove_advertiser"])
+        if kind == "advertiser":
+            advertiser = rng.choice(advertisers)
+            fields = rng.choice([
+                {"budget": rng.choice([0, 400, 1200, 5000])},
+                {"status": rng.choice(["active", "paused"])},
+                {"target_categories": rng.sample(CATEGORIES, rng.randint(0, 2))},
+                {"name": "renamed"},
+            ])
+            state.upsert_advertiser(advertiser["id"], fields)
+            advertiser.update(fields)
+        elif kind == "episode":
+            episode = rng.choice(episodes)
+            fields = rng.choice([
+                {"status": rng.choice(["published", "draft"])},
+                {"duration_minutes": rng.randint(5, 70)},
+                {"show_id": rng.choice(shows)["id"]},
+            ])
+            state.upsert_episode(episode["id"], fields)
+            episode.update(fields)
+        elif kind == "show":
+            show = rng.choice(shows)
+            fields = {"category": rng.choice(CATEGORIES)}
+            state.upsert_show(show["id"], fields)
+            show.update(fields)
+        elif kind == "new_advertiser":
+            advertiser = {"id": f"new{step}", "budget": 3000, "status": "active", "target_categories": []}
+            state.upsert_advertiser(advertiser["id"], dict(advertiser))
+            advertisers.append(advertiser)
+        elif kind == "remove_episode" and episodes:
+            episode = episodes.pop(rng.randrange(len(episodes)))
+            state.remove_episode(episode["id"])
+        elif kind == "remove_advertiser" and advertisers:
+            advertiser = advertisers.pop(rng.randrange(len(advertisers)))
+            state.remove_advertiser(advertiser["id"])
+        assert_same_as_reload(state, advertisers, episodes, shows)
+
+
+# ==================== ENGINE ====================
+
+def test_engine_reloads_when_a_change_arrives_during_the_load():
+    advertisers, episodes, shows = catalogue(3)
+    loads = []
+
+    async def scenario():
+        engine = AdPlacementEngine(None, ttl=None)
+
+        async def loader(user_id):
+            loads.append(user_id)
+            if len(loads) == 1:
+                # The change lands after this snapshot was read
+                engine.apply(user_id, {"collection": "advertisers", "op": "update", "doc_id": "a0", "data": {"budget": 0}})
+            return copy.deepcopy(advertisers), copy.deepcopy(episodes), copy.deepcopy(shows)
+
+        engine.loader = loader
+        return await asyncio.gather(engine.get("alice"), engine.get("alice"))
+
+    first, second = asyncio.run(scenario())
+    assert loads == ["alice", "alice"]
+    assert first is second
+
+
+def test_engine_applies_change_events_to_cached_states():
+    advertisers, episodes, shows = catalogue(4)
+
+    async def loader(user_id):
+        return copy.deepcopy(advertisers), copy.deepcopy(episodes), copy.deepcopy(shows)
+
+    async def scenario():
+        engine = AdPlacementEngine(loader, ttl=None)
+        state = await engine.get("alice")
+        engine.apply("alice", {"collection": "shows", "op": "update", "doc_id": "s0", "data": {"category": "news"}})
+        engine.apply("alice", {"collection": "episodes", "op": "delete", "doc_id": "e1"})
+        engine.apply("bob", {"collection": "episodes", "op": "delete", "doc_id": "e2"})
+        return state, await engine.get("alice")
+
+    state, again = asyncio.run(scenario())
+    assert state is again
+    update(shows, "s0", {"category": "news"})
+    assert_same_as_reload(state, advertisers, [episode for episode in episodes if episode["id"] != "e1"], shows)
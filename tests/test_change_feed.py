@@ -0,0 +1,134 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from pymongo.errors import OperationFailure
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from change_feed import ChangeBroker, MongoChangeSource, change_to_event  # noqa: E402
+
+
+def publish(broker: ChangeBroker, user_id: str, count: int = 1):
+    events = [{"id": broker.next_id(), "collection": "shows", "op": "update"} for _ in range(count)]
+    for event in events:
+        broker.publish(user_id, event)
+    return [event["id"] for event in events]
+
+
+def ids(events):
+    return [event["id"] for event in events]
+
+
+# ==================== REPLAY ====================
+
+def test_replay_returns_events_after_the_last_seen_one():
+    broker = ChangeBroker()
+    first, second, third = publish(broker, "alice", 3)
+    publish(broker, "bob")
+    assert ids(broker.replay("alice", first)) == [second, third]
+    assert broker.replay("alice", third) == []
+
+
+def test_replay_of_an_event_no_longer_in_history_is_none():
+    broker = ChangeBroker(history_size=2)
+    first, second, third = publish(broker, "alice", 3)
+    assert broker.replay("alice", first) is None
+    assert ids(broker.replay("alice", second)) == [third]
+    assert broker.replay("bob", first) is None
+
+
+def test_ids_from_another_process_never_match():
+    assert ChangeBroker().next_id() != ChangeBroker().next_id()
+
+
+# ==================== EVICTION ====================
+
+def test_history_of_inactive_users_expires():
+    broker = ChangeBroker(history_ttl=0.05)
+    (alice_event,) = publish(broker, "alice")
+    time.sleep(0.06)
+    (bob_event,) = publish(broker, "bob")
+    assert broker.replay("alice", alice_event) is None
+    assert broker.replay("bob", bob_event) == []
+
+
+def test_least_recently_active_users_are_evicted_beyond_max_users():
+    broker = ChangeBroker(max_users=2)
+    (alice_event,) = publish(broker, "alice")
+    (bob_event,) = publish(broker, "bob")
+    publish(broker, "alice")
+    publish(broker, "carol")
+    assert broker.replay("bob", bob_event) is None
+    assert len(broker.replay("alice", alice_event)) == 1
+
+
+def test_slow_subscribers_are_dropped():
+    async def scenario():
+        broker = ChangeBroker(max_queue=2)
+        slow = broker.subscribe("alice")
+        publish(broker, "alice", 3)
+        return broker, slow
+
+    broker, slow = asyncio.run(scenario())
+    assert slow.overflowed
+    assert broker.connection_count == 0
+
+
+def test_listeners_see_every_event_and_cannot_break_publishing():
+    broker = ChangeBroker()
+    seen = []
+    broker.add_listener(lambda user_id, event: 1 / 0)
+    broker.add_listener(lambda user_id, event: seen.append((user_id, event["id"])))
+    (event_id,) = publish(broker, "alice")
+    assert seen == [("alice", event_id)]
+
+
+# ==================== MONGO CHANGE STREAMS ====================
+
+def change(operation: str, **fields) -> dict:
+    return {"operationType": operation, "ns": {"coll": "shows"}, "_id": {"_data": "token"}, **fields}
+
+
+def test_deletes_are_attributed_through_the_pre_image():
+    event = change_to_event(change("delete", fullDocumentBeforeChange={"id": "s1", "user_id": "alice"}))
+    assert event == {"id": "token", "user_id": "alice", "collection": "shows", "op": "delete", "doc_id": "s1"}
+    assert change_to_event(change("delete", documentKey={"_id": "oid"})) is None
+
+
+def test_updates_carry_only_the_changed_fields():
+    event = change_to_event(change(
+        "update",
+        fullDocument={"_id": "oid", "id": "s1", "user_id": "alice", "title": "New", "status": "draft"},
+        updateDescription={"updatedFields": {"title": "New"}},
+    ))
+    assert event["op"] == "update"
+    assert event["data"] == {"title": "New"}
+
+
+class FakeDatabase:
+    def __init__(self, existing):
+        self.existing = set(existing)
+        self.enabled = []
+
+    async def command(self, name, collection, **options):
+        if collection == "advertisers":
+            raise OperationFailure("not authorized", code=13)
+        if collection not in self.existing:
+            raise OperationFailure("ns does not exist", code=26)
+        self.enabled.append((collection, options))
+
+    async def create_collection(self, collection, **options):
+        self.existing.add(collection)
+        self.enabled.append((collection, options))
+
+
+def test_pre_images_are_enabled_on_every_watched_collection():
+    database = FakeDatabase(existing=["shows"])
+    source = MongoChangeSource(lambda: database, ChangeBroker(), ["shows", "episodes", "advertisers"])
+    asyncio.run(source.enable_pre_images())
+    assert database.enabled == [
+        ("shows", {"changeStreamPreAndPostImages": {"enabled": True}}),
+        ("episodes", {"changeStreamPreAndPostImages": {"enabled": True}}),
+    ]
@@ -0,0 +1,141 @@
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from bson import ObjectId
+from bson.binary import Binary
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from compact_storage import (  # noqa: E402
+    decode_document,
+    encode_document,
+    encode_filter,
+    encode_operation,
+    encode_projection,
+    projects_id,
+)
+from migrate_compact_ids import migrate_collection, pending_filter  # noqa: E402
+
+SHOW_ID = str(uuid.uuid4())
+USER_ID = str(uuid.uuid4())
+EPISODE_ID = str(uuid.uuid4())
+
+
+def binary(value: str) -> Binary:
+    return Binary.from_uuid(uuid.UUID(value))
+
+
+# ==================== CODEC ====================
+
+def test_document_round_trip():
+    doc = {"id": SHOW_ID, "user_id": USER_ID, "host_id": "legacy-host", "title": "Show"}
+    encoded = encode_document(doc)
+    assert encoded == {"_id": binary(SHOW_ID), "user_id": binary(USER_ID), "host_id": "legacy-host", "title": "Show"}
+    assert decode_document(encoded) == doc
+
+
+def test_document_without_id_keeps_its_object_id():
+    object_id = ObjectId()
+    encoded = encode_document({"_id": object_id, "episode_id": EPISODE_ID, "peaks": [0.5]})
+    assert encoded == {"_id": object_id, "episode_id": binary(EPISODE_ID), "peaks": [0.5]}
+    assert decode_document(encoded) == {"episode_id": EPISODE_ID, "peaks": [0.5]}
+
+
+def test_filter_maps_id_and_references():
+    query = {"id": {"$in": [SHOW_ID]}, "$or": [{"user_id": USER_ID}, {"status": "active"}]}
+    assert encode_filter(query) == {
+        "_id": {"$in": [binary(SHOW_ID)]},
+        "$or": [{"user_id": binary(USER_ID)}, {"status": "active"}],
+    }
+
+
+@pytest.mark.parametrize("projection, expected", [
+    (None, True),
+    ({"_id": 0}, True),
+    ({"_id": 0, "title": 0}, True),
+    ({"_id": 0, "user_id": 1}, False),
+    ({"_id": 0, "id": 1, "title": 1}, True),
+    ({"_id": 0, "id": 0}, False),
+])
+def test_decoded_documents_carry_id_only_when_projected(projection, expected):
+    stored = {"_id": binary(SHOW_ID), "user_id": binary(USER_ID)}
+    assert ("id" in decode_document(stored, projects_id(projection))) is expected
+
+
+def test_projection_maps_id():
+    assert encode_projection({"_id": 0, "id": 1, "title": 1}) == {"_id": 1, "title": 1}
+    assert encode_projection({"_id": 0}) is None
+
+
+def test_bulk_operations_keep_their_options():
+    collation = {"locale": "en"}
+    update = encode_operation(UpdateOne(
+        {"id": SHOW_ID}, {"$set": {"tags.$[t]": "x"}}, upsert=True, collation=collation,
+        array_filters=[{"t": "y"}], hint=[("id", 1)], sort={"id": 1},
+    ))
+    assert update._filter == {"_id": binary(SHOW_ID)}
+    assert update._upsert is True
+    assert update._collation == collation
+    assert update._array_filters == [{"t": "y"}]
+    assert update._hint == {"_id": 1}
+    assert update._sort == {"_id": 1}
+
+    replace = encode_operation(ReplaceOne({"id": SHOW_ID}, {"id": SHOW_ID}, hint="status_1"))
+    assert replace._doc == {"_id": binary(SHOW_ID)}
+    assert replace._hint == "status_1"
+
+    many = encode_operation(UpdateMany({"user_id": USER_ID}, {"$set": {"status": "archived"}}, collation=collation))
+    assert many._collation == collation
+    assert encode_operation(DeleteOne({"id": SHOW_ID}, hint="_id_"))._hint == "_id_"
+    assert encode_operation(InsertOne({"id": SHOW_ID}))._doc == {"_id": binary(SHOW_ID)}
+
+
+# ==================== MIGRATION ====================
+
+@pytest.fixture
+def database():
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient()["podcast_network"]
+    for name in ("shows", "waveforms"):
+        collection = database[name]
+
+        # mongomock's bulk_write does not accept the request options of current pymongo
+        def bulk_write(operations, ordered=True, collection=collection):
+            for operation in operations:
+                if isinstance(operation, ReplaceOne):
+                    collection.replace_one(operation._filter, operation._doc, upsert=operation._upsert)
+                else:
+                    collection.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+        collection.bulk_write = bulk_write
+    return database
+
+
+def test_migration_round_trip(database):
+    database.shows.insert_one({"id": SHOW_ID, "user_id": USER_ID, "title": "Show"})
+    database.shows.create_index("id", unique=True)
+    database.waveforms.insert_one({"episode_id": EPISODE_ID, "user_id": USER_ID, "peaks": [0.1]})
+
+    assert migrate_collection(database.shows, reverse=False, batch_size=1) == 1
+    assert migrate_collection(database.waveforms, reverse=False, batch_size=1) == 1
+    assert database.shows.find_one({}, {"_id": 1, "id": 1}) == {"_id": binary(SHOW_ID)}
+    assert "id_1" not in database.shows.index_information()
+    waveform = database.waveforms.find_one()
+    assert isinstance(waveform["_id"], ObjectId)
+    assert waveform["episode_id"] == binary(EPISODE_ID)
+    assert waveform["user_id"] == binary(USER_ID)
+
+    # Running it again finds nothing left to convert
+    assert database.shows.count_documents(pending_filter(False)) == 0
+    assert database.waveforms.count_documents(pending_filter(False)) == 0
+
+    assert migrate_collection(database.shows, reverse=True, batch_size=1) == 1
+    assert migrate_collection(database.waveforms, reverse=True, batch_size=1) == 1
+    show = database.shows.find_one({}, {"_id": 0})
+    assert show == {"id": SHOW_ID, "user_id": USER_ID, "title": "Show"}
+    assert isinstance(database.shows.find_one()["_id"], ObjectId)
+    assert database.waveforms.find_one({}, {"_id": 0}) == {"episode_id": EPISODE_ID, "user_id": USER_ID, "peaks": [0.1]}
+    assert database.waveforms.count_documents(pending_filter(True)) == 0
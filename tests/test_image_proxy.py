@@ -0,0 +1,43 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from image_proxy import ImageCache  # noqa: E402
+
+META = {"content_type": "image/png", "etag": '"e"', "fetched_at": 0.0}
+
+
+def stored_keys(directory: Path):
+    return sorted(path.stem for path in directory.glob("*.img"))
+
+
+def test_store_keeps_the_directory_under_the_bound(tmp_path):
+    async def scenario():
+        cache = ImageCache(tmp_path, max_bytes=250)
+        await cache.load()
+        for key in "abc":
+            await cache._store(key, b"x" * 100, META)
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert stored_keys(tmp_path) == ["b", "c"]
+    assert cache._total == 200
+
+
+def test_workers_sharing_a_directory_count_each_others_entries(tmp_path):
+    async def scenario():
+        first = ImageCache(tmp_path, max_bytes=250, rescan_seconds=0)
+        second = ImageCache(tmp_path, max_bytes=250, rescan_seconds=0)
+        await first.load()
+        await second.load()
+        await first._store("a", b"x" * 100, META)
+        assert second._lookup("a") is not None  # Adopted from disk on a miss
+        await second._store("b", b"x" * 100, META)
+        await first._store("c", b"x" * 100, META)  # Rescans, sees "b", evicts the oldest
+        return first, second
+
+    first, _ = asyncio.run(scenario())
+    assert len(stored_keys(tmp_path)) == 2
+    assert first._total == 200
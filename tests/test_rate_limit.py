@@ -0,0 +1,280 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+from starlette.datastructures import Headers
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import rate_limit  # noqa: E402
+from rate_limit import (  # noqa: E402
+    AdmissionControlMiddleware, MemoryRateLimitBackend, MongoRateLimitBackend, RateLimitMiddleware, parse_rules
+)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def call(app, path="/api/auth/login", method="POST", headers=(), client=("10.0.0.1", 5000)):
+    """Send one request through ``app``; returns the response status"""
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers), "client": client}
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await app(scope, receive, send)
+    return statuses[0]
+
+
+async def ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def forwarded(value: str):
+    return [(b"x-forwarded-for", value.encode())]
+
+
+def forwarded_headers(value: str) -> Headers:
+    return Headers(raw=forwarded(value))
+
+
+def limiter(**options):
+    return RateLimitMiddleware(
+        ok,
+        backend=MemoryRateLimitBackend(),
+        rules=parse_rules("POST /api/auth/login=1/60"),
+        user_id_resolver=lambda authorization: None,
+        **options,
+    )
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+# ==================== RULES ====================
+
+def test_rules_parse_limits_and_bursts():
+    login, catch_all = parse_rules("POST /api/auth/login=5/60:10; * /api/*=20/1")
+    assert (login.method, login.path, login.limit, login.period, login.burst) == ("POST", "/api/auth/login", 5, 60.0, 10)
+    assert catch_all.burst == 20
+    assert catch_all.rate == 20.0
+    assert login.matches("POST", "/api/auth/login") and not login.matches("GET", "/api/auth/login")
+    assert catch_all.matches("DELETE", "/api/shows/1") and not catch_all.matches("GET", "/health")
+
+
+def test_first_matching_rule_wins():
+    app = RateLimitMiddleware(ok, MemoryRateLimitBackend(), parse_rules("POST /api/auth/login=1/60; * /api/*=20/1"), lambda _: None)
+    assert app.rule_for("POST", "/api/auth/login").limit == 1
+    assert app.rule_for("POST", "/api/shows").limit == 20
+    assert app.rule_for("GET", "/uploads/a.png") is None
+
+
+# ==================== TOKEN BUCKET ====================
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    backend = MemoryRateLimitBackend()
+
+    async def take():
+        return await backend.take("key", rate=1.0, capacity=3)
+
+    assert [run(take())[0] for _ in range(4)] == [True, True, True, False]
+    assert run(take()) == (False, 1.0)
+    clock.now += 0.5
+    assert run(take()) == (False, 0.5)
+    clock.now += 0.5
+    assert run(take()) == (True, 0.0)
+    clock.now += 100
+    assert [run(take())[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_buckets_are_separate_per_key(clock):
+    backend = MemoryRateLimitBackend()
+    assert run(backend.take("a", 1.0, 1)) == (True, 0.0)
+    assert run(backend.take("a", 1.0, 1))[0] is False
+    assert run(backend.take("b", 1.0, 1)) == (True, 0.0)
+
+
+def test_full_buckets_are_evicted_first(clock):
+    backend = MemoryRateLimitBackend(max_keys=2)
+    run(backend.take("idle", 10.0, 1))
+    clock.now += 1
+    run(backend.take("busy", 0.01, 1))
+    run(backend.take("new", 0.01, 1))
+    assert set(backend._buckets) == {"busy", "new"}
+
+
+def test_mongo_backend_fails_open():
+    class Unreachable:
+        async def create_index(self, *args, **kwargs):
+            raise ServerSelectionTimeoutError("no primary")
+
+    assert run(MongoRateLimitBackend(lambda: Unreachable()).take("key", 1.0, 1)) == (True, 0.0)
+
+
+# ==================== MIDDLEWARE ====================
+
+class RecordingBackend(MemoryRateLimitBackend):
+    def __init__(self):
+        super().__init__()
+        self.keys = []
+
+    async def take(self, key, rate, capacity, cost=1):
+        self.keys.append(key)
+        return await super().take(key, rate, capacity, cost)
+
+
+def test_shared_rules_use_the_shared_backend_and_users_are_keyed_by_id():
+    local, shared = RecordingBackend(), RecordingBackend()
+    app = RateLimitMiddleware(
+        ok,
+        local,
+        parse_rules("POST /api/auth/login=1/60; * /api/*=20/1"),
+        lambda authorization: "alice" if authorization == "Bearer token" else None,
+        shared_backend=shared,
+        shared_rules=["POST /api/auth/login"],
+    )
+
+    async def scenario():
+        await call(app)
+        await call(app, path="/api/shows", method="GET", headers=[(b"authorization", b"Bearer token")])
+
+    run(scenario())
+    assert shared.keys == ["POST /api/auth/login|ip:10.0.0.1"]
+    assert local.keys == ["* /api/*|user:alice"]
+
+
+def test_rejections_carry_retry_after():
+    app = limiter()
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def scenario():
+        scope = {"type": "http", "method": "POST", "path": "/api/auth/login", "headers": [], "client": ("10.0.0.1", 1)}
+        await app(scope, receive, send)
+        messages.clear()
+        await app(scope, receive, send)
+
+    run(scenario())
+    start = messages[0]
+    assert start["status"] == 429
+    assert dict(start["headers"])[b"retry-after"] == b"60"
+
+
+# ==================== ADMISSION CONTROL ====================
+
+def test_requests_over_the_cap_are_shed_without_a_queue():
+    release = asyncio.Event()
+
+    async def slow(scope, receive, send):
+        await release.wait()
+        await ok(scope, receive, send)
+
+    async def scenario():
+        app = AdmissionControlMiddleware(slow, max_in_flight=1)
+        first = asyncio.create_task(call(app, path="/api/shows", method="GET"))
+        await asyncio.sleep(0)
+        assert app.in_flight == 1
+        shed = await call(app, path="/api/shows", method="GET")
+        release.set()
+        return await first, shed, app.in_flight
+
+    assert run(scenario()) == (200, 503, 0)
+
+
+def test_queued_requests_get_a_slot_when_one_frees_up():
+    release = asyncio.Event()
+
+    async def slow(scope, receive, send):
+        await release.wait()
+        await ok(scope, receive, send)
+
+    async def scenario():
+        app = AdmissionControlMiddleware(slow, max_in_flight=1, queue_timeout=1.0)
+        first = asyncio.create_task(call(app, path="/api/shows", method="GET"))
+        queued = asyncio.create_task(call(app, path="/api/shows", method="GET"))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await first, await queued
+
+    assert run(scenario()) == (200, 200)
+
+
+def test_queued_requests_are_shed_after_the_timeout_and_streams_are_exempt():
+    async def stuck(scope, receive, send):
+        if scope["path"] == "/api/shows":
+            await asyncio.sleep(1)
+        await ok(scope, receive, send)
+
+    async def scenario():
+        app = AdmissionControlMiddleware(stuck, max_in_flight=1, queue_timeout=0.01, exempt_paths=("/api/changes",))
+        first = asyncio.create_task(call(app, path="/api/shows", method="GET"))
+        await asyncio.sleep(0)
+        shed = await call(app, path="/api/hosts", method="GET")
+        stream = await call(app, path="/api/changes", method="GET")
+        first.cancel()
+        return shed, stream
+
+    assert run(scenario()) == (503, 200)
+
+
+# ==================== CLIENT ADDRESS ====================
+
+def test_forwarded_for_is_ignored_without_trusted_proxies():
+    app = limiter()
+
+    async def scenario():
+        return [await call(app, headers=forwarded(f"198.51.100.{n}")) for n in range(3)]
+
+    assert run(scenario()) == [200, 429, 429]
+
+
+def test_rotating_client_set_entries_does_not_reset_the_bucket():
+    app = limiter(proxy_hops=1)
+
+    async def scenario():
+        # The proxy appends the address it saw; everything left of it is client-controlled
+        return [await call(app, headers=forwarded(f"198.51.100.{n}, 203.0.113.7")) for n in range(3)]
+
+    assert run(scenario()) == [200, 429, 429]
+
+
+def test_clients_behind_the_proxy_get_their_own_buckets():
+    app = limiter(proxy_hops=1)
+    assert app.client_ip(forwarded_headers("203.0.113.7"), {"client": ("10.0.0.1", 1)}) == "203.0.113.7"
+
+    async def scenario():
+        return [await call(app, headers=forwarded(f"203.0.113.{n}")) for n in range(3)]
+
+    assert run(scenario()) == [200, 200, 200]
+
+
+def test_missing_forwarded_for_falls_back_to_the_peer():
+    app = limiter(proxy_hops=2)
+    assert app.client_ip(forwarded_headers("203.0.113.7"), {"client": ("10.0.0.1", 1)}) == "10.0.0.1"
+
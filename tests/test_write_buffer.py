@@ -0,0 +1,119 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from write_buffer import WriteBehindBuffer  # noqa: E402
+
+
+class FakeCollection:
+    """Records each bulk_write as {doc_id: fields}; fails while ``failures`` is positive"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("primary stepped down")
+        self.batches.append({operation._filter["id"]: operation._doc["$set"] for operation in operations})
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+# ==================== MERGING ====================
+
+def test_updates_within_the_window_are_merged_into_one_write():
+    collection = FakeCollection()
+
+    async def scenario():
+        buffer = WriteBehindBuffer(lambda: collection, window=0.01)
+        await buffer.update("a", {"title": "One", "status": "draft"})
+        await buffer.update("a", {"title": "Two"})
+        await buffer.update("b", {"status": "published"})
+        await asyncio.sleep(0.05)
+        return buffer
+
+    buffer = run(scenario())
+    assert collection.batches == [{"a": {"title": "Two", "status": "draft"}, "b": {"status": "published"}}]
+    assert (buffer.writes_buffered, buffer.writes_flushed) == (3, 2)
+
+
+def test_pending_changes_are_overlaid_on_reads():
+    collection = FakeCollection()
+
+    async def scenario():
+        buffer = WriteBehindBuffer(lambda: collection, window=60)
+        await buffer.update("a", {"title": "New"})
+        overlaid = buffer.overlay_many([{"id": "a", "title": "Old", "status": "draft"}, {"id": "b", "title": "B"}])
+        await buffer.close()
+        return overlaid
+
+    assert run(scenario()) == [{"id": "a", "title": "New", "status": "draft"}, {"id": "b", "title": "B"}]
+    assert collection.batches == [{"a": {"title": "New"}}]
+
+
+def test_reaching_max_pending_flushes_immediately():
+    collection = FakeCollection()
+
+    async def scenario():
+        buffer = WriteBehindBuffer(lambda: collection, window=60, max_pending=2)
+        await buffer.update("a", {"title": "A"})
+        assert collection.batches == []
+        await buffer.update("b", {"title": "B"})
+        await buffer.close()
+
+    run(scenario())
+    assert collection.batches == [{"a": {"title": "A"}, "b": {"title": "B"}}]
+
+
+def test_discarded_documents_are_not_written():
+    collection = FakeCollection()
+
+    async def scenario():
+        buffer = WriteBehindBuffer(lambda: collection, window=60)
+        await buffer.update("a", {"title": "A"})
+        buffer.discard("a")
+        await buffer.close()
+
+    run(scenario())
+    assert collection.batches == []
+
+
+# ==================== RETRY ====================
+
+def test_failed_flush_is_retried_with_newer_changes_winning():
+    collection = FakeCollection(failures=1)
+
+    async def scenario():
+        buffer = WriteBehindBuffer(lambda: collection, window=0.01)
+        await buffer.update("a", {"title": "One", "status": "draft"})
+        await buffer.flush()
+        # Still visible to reads while waiting for the retry
+        assert buffer.overlay({"id": "a"}) == {"id": "a", "title": "One", "status": "draft"}
+        await buffer.update("a", {"title": "Two"})
+        await asyncio.sleep(0.05)
+
+    run(scenario())
+    assert collection.batches == [{"a": {"title": "Two", "status": "draft"}}]
+
+
+def test_barrier_raises_when_changes_cannot_be_written():
+    collection = FakeCollection(failures=1)
+
+    async def scenario():
+        buffer = WriteBehindBuffer(lambda: collection, window=60)
+        await buffer.update("a", {"title": "A"})
+        with pytest.raises(AutoReconnect):
+            await buffer.barrier()
+        await buffer.barrier()
+
+    run(scenario())
+    assert collection.batches == [{"a": {"title": "A"}}]